@@ -1,9 +1,11 @@
 ﻿import numpy as np
-import requests
 from pynput import keyboard
-import time, csv, os
+import time, os
 from datetime import datetime
 import threading
+import collections
+from noraxon_client import NoraxonClient
+from stream_recorder import StreamRecorder, AnnotationLog, annotations_path, export_windows
 
 # Create data directory
 save_dir = os.path.join('data', 'Noraxon')
@@ -14,47 +16,28 @@ now = datetime.now()
 filename = f"pressure_{now.strftime('%d-%m-hour-%H-min-%M')}.csv"
 save_path = os.path.join(save_dir, filename)
 
-# Global list to collect all labeled data
-all_data = []
-i = 1  # window counter
+# One continuous recording, streamed to disk as it arrives (float32, fsync'ed every 2 s,
+# each chunk stamped with its arrival time). Key presses only note the time; the labelled
+# windows are cut from the recording at the end, so overlapping presses each get their
+# full window and a crash keeps the session:
+# `python stream_recorder.py <file.srec> [out.csv] [window seconds]` cuts them again
+recording_path = os.path.splitext(save_path)[0] + '.srec'
 SAMPLE_DURATION = 3  # seconds
+CHUNK_DURATION = 0.25  # seconds between writes to the recording
 current_class_label = "l0"
 
 # --- Data Acquisition ---
-def get_data():
-    """Fetch EMG data from Noraxon HTTP API"""
-    try:
-        url = 'http://127.0.0.1:9220/samples'
-        response = requests.get(url)
-        if response.status_code == 200:
-            json_data = response.json()
-            emg_1 = json_data['channels'][0]['samples']
-            emg_2 = json_data['channels'][1]['samples']
-            emg_3 = json_data['channels'][2]['samples']
-            return list(zip(emg_1, emg_2, emg_3))
-        else:
-            print(f"Error: Unable to fetch data. Status code: {response.status_code}")
-            return []
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return []
-
-def collect_labeled_data(label):
-    global i
+# Background reader on a keep-alive connection; it keeps draining the device buffer
+client = NoraxonClient(n_channels=3).start()
+recorder = StreamRecorder(recording_path, sampling_rate=client.sampling_rate)
+annotations = AnnotationLog(annotations_path(recording_path))
+stop_requested = threading.Event()
 
-    _ = get_data()  # Clear buffer
 
-    print(f"\nLabel '{label}' triggered. Buffer cleared...")
-    time.sleep(SAMPLE_DURATION)
+def annotate(label):
+    annotations.mark(label)
+    print(f"\nWindow {annotations.count}: label '{label}' triggered.")
 
-    samples = get_data()
-    if samples:
-        for s in samples:
-            all_data.append([i, label] + list(s))  # Include window number `i`
-        print(f"Window {i}: Collected {len(samples)} samples for label '{label}'.")
-        i += 1
-    else:
-        print("[WARN] No samples collected.")
 
 def on_press(key):
     global current_class_label
@@ -64,7 +47,7 @@ def on_press(key):
 
         if key_char == 'q':
             # Use current class label
-            threading.Thread(target=collect_labeled_data, args=(current_class_label,)).start()
+            annotate(current_class_label)
 
         elif key_char == 'p':
             # Ask for new class name in terminal
@@ -75,7 +58,7 @@ def on_press(key):
 
         else:
             # Any other key uses current label
-            threading.Thread(target=collect_labeled_data, args=(current_class_label,)).start()
+            annotate(current_class_label)
 
     except AttributeError:
         pass
@@ -83,12 +66,7 @@ def on_press(key):
 
 def on_release(key):
     if key == keyboard.Key.esc:
-        print(f"\n[INFO] Saving CSV with {len(all_data)} rows...")
-        with open(save_path, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(["window", "label", "ch_1", "ch_2", "ch_3"])
-            writer.writerows(all_data)
-        print(f"[DONE] Saved annotations to {save_path}")
+        stop_requested.set()
         return False
 
 # Start key listener
@@ -103,6 +81,17 @@ listener_thread = threading.Thread(target=start_listener)
 listener_thread.daemon = True
 listener_thread.start()
 
-# Keep main thread alive
-while listener_thread.is_alive():
-    time.sleep(0.1)
+# Record until ESC, and until the window of the last press is complete
+while not (stop_requested.is_set() and
+           time.perf_counter() > (annotations.last or 0.0) + SAMPLE_DURATION + CHUNK_DURATION):
+    time.sleep(CHUNK_DURATION)
+    samples = client.drain()
+    if len(samples):
+        recorder.write(-1, '', samples, client.arrival_time(client.read_pos - 1))
+
+client.stop()
+recorder.close()
+annotations.close()
+print(f"\n[INFO] Recorded {recorder.samples} samples, cutting {annotations.count} windows of {SAMPLE_DURATION}s...")
+labels = export_windows(recording_path, annotations.path, save_path, SAMPLE_DURATION)
+print(f"[DONE] Saved {len(labels)} windows {dict(collections.Counter(labels))} to {save_path}")
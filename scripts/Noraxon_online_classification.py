@@ -1,15 +1,27 @@
-﻿import numpy as np
-import requests
-import time
-import joblib
-from scipy.signal import butter, filtfilt, iirnotch, hilbert, find_peaks
-from pykalman import KalmanFilter
-import pywt
-import pandas as pd
-import tkinter as tk
-from tkinter import ttk
+﻿import time
+started_at = time.perf_counter()  # for the time-to-first-prediction report
+import numpy as np
 import threading
-import socket
+import os
+import sys
+from noraxon_client import NoraxonClient
+from emg_filters import FilterBank, KalmanSmoother
+from emg_envelope import EnvelopeDetector, envelope
+from emg_features import extract_features, feature_columns, RollingFeatures
+from ring_buffer import RingBuffer
+from control import ControlChannel, window_samples
+from fast_model import CompiledModel
+from model_registry import ModelRegistry, ModelBundle, SHARED_USER, DEFAULT_VARIANT
+from decision_engine import DecisionEngine
+from latency import LatencyTracker
+from prediction_journal import PredictionJournal
+from output_router import OutputRouter
+from pipeline import BoundedQueue, QueueClosed, StatsReporter, format_stats, start_stage
+
+imported_at = time.perf_counter()
+
+# The optional DSP backend (scipy.signal.hilbert) and tkinter are imported where they
+# are used, so a headless run with those stages off never pays for them
 
 # ---------------- Settings -----------------
 USE_BANDPASS = 1
@@ -21,10 +33,54 @@ USE_ENVELOPE = 0
 USE_ZSCORE = 0
 USE_SCALING = 1
 
+# USE_ENVELOPE: 'rectify' (|x| + 10 Hz low-pass) or 'hilbert' (causal FIR Hilbert transformer,
+# the streaming replacement for USE_HILBERT). Models must be trained on emg_envelope.envelope()
+ENVELOPE_METHOD = 'rectify'
+
+# No Tk window, e.g. when running as a service (same as passing --headless).
+# Stop / pause / reconfigure through signals or `python control.py <command>`
+HEADLESS = 0
+
+# 'zero_phase': filtfilt over every window, same as the offline training pipeline
+# 'streaming':  causal filtering of each new sample once, state carried between hops
+FILTER_MODE = 'zero_phase'
+
+# Update the time-domain features from running sums per hop instead of recomputing every
+# window. Needs FILTER_MODE = 'streaming' and no per-window stages (Hilbert, TKEO, z-score);
+# Kalman and the envelope are fine, they then run on the stream
+USE_ROLLING_FEATURES = 0
+
 sampling_rate = 1500
 window_size_seconds = 1.25
 window_size_samples = int(window_size_seconds * sampling_rate)
 
+# Sliding windows: one prediction every hop over the trailing window (0 = back-to-back windows)
+hop_size_seconds = 0.1
+hop_size_samples = int(hop_size_seconds * sampling_rate) or window_size_samples
+
+# The consecutive-prediction counts in the override logic were tuned on back-to-back
+# windows; scale them so they still cover the same stretch of time when windows overlap
+decisions_per_window = max(1, window_size_samples // hop_size_samples)
+
+# Acquisition -> inference -> output run in separate threads joined by bounded queues.
+# 'drop_oldest' / 'coalesce' never hold up the stage before, 'block' loses nothing
+WINDOW_QUEUE_SIZE = 2
+WINDOW_QUEUE_POLICY = 'drop_oldest'
+OUTPUT_QUEUE_SIZE = 1
+OUTPUT_QUEUE_POLICY = 'coalesce'   # GUI / Unity only need the freshest prediction
+QUEUE_STATS_SECONDS = 10           # print queue depth / drops this often (0 = never)
+
+# Per-stage latency from sample arrival to the UDP send (p50 / p95 / p99), rewritten
+# every LATENCY_SECONDS (None = only printed at the end)
+LATENCY_FILE = "latency_noraxon.txt"
+LATENCY_SECONDS = 10
+
+# Every prediction (raw and filtered, with its latency) goes to a binary journal written
+# in the background (see prediction_journal.py); printing each one costs the loop a
+# console write per window, so it is off unless PRINT_PREDICTIONS
+JOURNAL_PREFIX = "data/online_annotations/noraxon"
+PRINT_PREDICTIONS = 0
+
 channels = ['ch_1', 'ch_2', 'ch_3']
 
 # Pressure ranges (slight, medium, hard)
@@ -35,35 +91,34 @@ HARD_PRESSURE = 100
 # UDP communication
 UNITY_IP = "172.27.228.52"  # Use the Quest or Unity PC IP if not running on the same machine
 UNITY_PORT = 5052
-udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+# Every prediction goes to each of these (see output_router.py). format: 'text'
+# ("l,50,0,0") or 'binary' (sequenced, timestamped; needs the current UDP_Listener.cs).
+# change_only sends a prediction only if it differs from the last one, plus a heartbeat
+# every `heartbeat` s (the tasks count consecutive messages, so leave it off for them)
+UNITY_ENDPOINTS = [
+    {'name': 'unity', 'host': UNITY_IP, 'port': UNITY_PORT, 'format': 'text', 'change_only': False},
+    # {'name': 'editor', 'host': '127.0.0.1', 'port': 5052, 'format': 'binary', 'max_rate': 30},
+    # {'name': 'recorder', 'host': '127.0.0.1', 'port': 5053, 'format': 'binary'},
+]
 
 # ---------------- Filters -----------------
-def bandpass_filter(data, lowcut=5.0, highcut=120.0, fs=sampling_rate, order=4):
-    nyq = 0.5 * fs
-    low = lowcut / nyq
-    high = highcut / nyq
-    b, a = butter(order, [low, high], btype='band')
-    return filtfilt(b, a, data)
-
-def notch_filter(signal, freq=50.0, fs=250, quality=30):
-    nyquist = 0.5 * fs
-    norm_freq = freq / nyquist
-    b, a = iirnotch(norm_freq, quality)
-    return filtfilt(b, a, signal)
+filter_bank = FilterBank(fs=sampling_rate, n_channels=len(channels),
+                         band=(5.0, 120.0) if USE_BANDPASS else None,
+                         notch=50.0 if USE_NOTCH else None)
 
 def hilbert_envelope(signal):
+    from scipy.signal import hilbert
     analytic = hilbert(signal)
     return np.abs(analytic)
 
-def kalman(signal):
-    signal = signal.reshape(-1, 1)
-    kf = KalmanFilter(transition_matrices=[1],
-                      observation_matrices=[1],
-                      initial_state_mean=0,
-                      observation_covariance=0.01,
-                      transition_covariance=1e-5)
-    state_means, _ = kf.filter(signal)
-    return state_means.flatten()
+# Same random-walk model as the pykalman filter used before (transition_covariance=1e-5,
+# observation_covariance=0.01), with its start-up gains, then the steady-state gain
+KALMAN_Q = 1e-5
+KALMAN_R = 0.01
+
+def kalman(window):
+    """Kalman smoothing of a whole (n, n_channels) window, started afresh (pykalman's filter())."""
+    return KalmanSmoother(window.shape[1], KALMAN_Q, KALMAN_R).process(window)
 
 def tkeo(signal):
     output = np.zeros_like(signal)
@@ -72,57 +127,13 @@ def tkeo(signal):
     return output
 
 # ---------------- Feature extraction ----------------
-def rms(signal):
-    return np.sqrt(np.mean(signal**2))
-
-def rms_signed_difference(signal):
-    mean_val = np.mean(signal)
-    diff = signal - mean_val
-    return np.sqrt(np.mean(diff**2))
-
-def zero_crossings(signal):
-    signs = np.signbit(signal)
-    return np.sum(signs[1:] != signs[:-1])
-
-def waveform_length(signal):
-    return np.sum(np.abs(np.diff(signal)))
-
-def mav(signal):
-    return np.mean(np.abs(signal))
-
-def iav(signal):
-    return np.sum(np.abs(signal))
-
-def mean_frequency(signal, fs=sampling_rate):
-    freqs = np.fft.rfftfreq(len(signal), d=1/fs)
-    fft_vals = np.abs(np.fft.rfft(signal))
-    power = fft_vals**2
-    if np.sum(power) == 0:
-        return 0
-    return np.sum(freqs * power) / np.sum(power)
-
-def extract_features(window):
-    feature_names = ['RMS', 'RMS_SD', 'ZC', 'WL', 'MAV', 'STD', 'VAR', 'IAV', 'MF']
-    feats = []
-    for ch_idx in range(len(channels)):
-        ch_signal = window[:, ch_idx]
-        feats.extend([
-            rms(ch_signal),
-            rms_signed_difference(ch_signal),
-            zero_crossings(ch_signal),
-            waveform_length(ch_signal),
-            mav(ch_signal),
-            np.std(ch_signal),
-            np.var(ch_signal),
-            iav(ch_signal),
-            mean_frequency(ch_signal)
-        ])
-    cols = [f"{ch}_{feat}" for ch in channels for feat in feature_names]
-    return pd.DataFrame([feats], columns=cols)
+feature_cols = feature_columns(channels)
 
 # ---------------- GUI Setup ----------------------
 class EMGApp:
     def __init__(self, root):
+        import tkinter as tk
+        from tkinter import ttk
         self.root = root
         self.root.title("EMG UI")
         self.root.geometry("550x300")
@@ -182,198 +193,334 @@ class EMGApp:
             self.slider_labels[key].config(text=level_text, fg=color)
 
 
-# ---------------- Data acquisition ----------------
-def get_data():
-    try:
-        url = 'http://127.0.0.1:9220/samples'
-        response = requests.get(url)
-        if response.status_code == 200:
-            json_data = response.json()
-            channels_data = json_data.get('channels', [])
-            if len(channels_data) < 3:
-                #print(f"Warning: expected 3 channels but got {len(channels_data)}")
-                return []
-            emg_1 = channels_data[0]['samples']
-            emg_2 = channels_data[1]['samples']
-            emg_3 = channels_data[2]['samples']
-            return list(zip(emg_1, emg_2, emg_3))
-        else:
-            print(f"Error: Unable to fetch data. Status code: {response.status_code}")
-            return []
-    except Exception as e:
-        print(f"Exception in get_data: {e}")
-        return []
-
-
 # ---------------- Main online classification ----------------
 
 
-def run_model_loop(app):
-
-    # Load models and scalers
-    pos_clf = joblib.load("../notebooks/models/4_classes_cont_01_07.pkl")
-    pos_scaler = joblib.load("../notebooks/models/4_classes_scaler_cont_01_07.pkl") if USE_SCALING else None
-    pressure_regressor = joblib.load("../notebooks/models/regressor_01_07.joblib") # whole pipeline already included, it is not necessary to upload the scaler
-
-    # Buffers for data
-    buffer = [] 
-
-    # State variables for your new filtering logic
-    swallow_count = 0
-    override_to_r = False
-
-    override_active = False
-    override_label = None
-    override_count = 0
-
-    print(f"Starting online classification with window size {window_size_seconds}s ({window_size_samples} samples)...")
-
-    while True:
-        new_data = get_data()
-        if not new_data:
-            time.sleep(0.1)
-            continue
-
-        buffer.extend(new_data)
-
-        # If buffer full enough
-        if len(buffer) >= window_size_samples: 
-            window = np.array(buffer[:window_size_samples])
-            buffer = buffer[window_size_samples:]  # clear buffer
-
-            # Apply filtering channel-wise
-            for i in range(window.shape[1]):
-                if i in [0,1,2]:
-                    if USE_NOTCH == 1:
-                        window[:, i] = notch_filter(window[:, i], fs=sampling_rate)
-                    if USE_BANDPASS == 1:
-                        window[:, i] = bandpass_filter(window[:, i])
-                    if USE_HILBERT == 1:
+MODELS_DIR = "../notebooks/models"
+
+# Models to start with: user 'all' are the shared models (variant = training date, e.g.
+# '01_07', '01_07_050'), user '3'..'8' the per-user ones (variant 'default').
+# Switch while running with `python control.py user <id> [variant]`
+MODEL_USER = SHARED_USER
+MODEL_VARIANT = '01_07'
+MODEL_CACHE_MB = 256     # loaded bundles kept for switching back, least recently used dropped first
+
+
+def run_model_loop(app, control):
+    # Changed by 'window' commands from the control channel
+    global window_size_samples, hop_size_samples, decisions_per_window
+
+    # Load models and scalers (the pressure regressor is a pipeline with its own scaler).
+    # Scaler folded in, NumPy rows in, no DataFrames; fails if the feature columns do not match
+    registry = ModelRegistry(MODELS_DIR, budget_mb=MODEL_CACHE_MB, columns=feature_cols,
+                             use_scaler=bool(USE_SCALING))
+
+    def load_and_warm_up():
+        # Runs on the loader thread while the GUI and acquisition start. One dummy window
+        # through the whole per-window path, so the first real one does not pay for
+        # first-call setup (filter / FFT plans, buffers)
+        bundle = registry.get(MODEL_USER, MODEL_VARIANT)
+        window = filter_bank.zero_phase(np.random.default_rng(0).standard_normal((window_size_samples, len(channels))))
+        if USE_HILBERT:
+            window[:, 0] = hilbert_envelope(window[:, 0])
+        row = extract_features(window, fs=sampling_rate)
+        bundle['position'].predict(row)
+        bundle['pressure'].predict(row)
+        return bundle
+
+    startup = registry.submit(load_and_warm_up)
+    pos_model = pressure_model = None
+    models_of = (MODEL_USER, MODEL_VARIANT)  # (user, variant) of the models in use, set on a 'user' switch
+
+    def load_position_model(name, user, variant):
+        # 'model <file>' command: one classifier file, with the scaler of the models in use
+        entry = registry.index.get((user, 'position', variant), {})
+        scaler = registry.load(entry['scaler']) if USE_SCALING and 'scaler' in entry else None
+        return CompiledModel(registry.load(os.path.join(MODELS_DIR, name)), scaler, columns=feature_cols)
+
+    # Acquisition runs in its own thread on a keep-alive connection
+    client = NoraxonClient(n_channels=len(channels), sampling_rate=sampling_rate).start()
+
+    print(f"Starting online classification with window size {window_size_seconds}s ({window_size_samples} samples), "
+          f"hop {hop_size_samples / sampling_rate}s ({hop_size_samples} samples)...")
+
+    # Windows -> inference -> output, each stage in its own thread
+    windows = BoundedQueue(WINDOW_QUEUE_SIZE, WINDOW_QUEUE_POLICY, name='windows')
+    outputs = BoundedQueue(OUTPUT_QUEUE_SIZE, OUTPUT_QUEUE_POLICY, name='outputs')
+    reporter = StatsReporter([windows, outputs], QUEUE_STATS_SECONDS)
+    # Each segment also holds the queue wait in front of it
+    latency = LatencyTracker(('arrival', 'window', 'filter', 'features', 'position', 'pressure', 'output'),
+                             LATENCY_FILE, LATENCY_SECONDS)
+    journal = PredictionJournal(JOURNAL_PREFIX)
+    router = OutputRouter(UNITY_ENDPOINTS)
+    print(f"[INFO] Sending predictions to {router.describe()}")
+    pending = None  # (what, Future) from a 'model' / 'user' command, loading in the background
+
+    # Streaming mode without Hilbert: the Kalman stage follows the causal filter directly,
+    # so it runs once per sample in acquisition with its state carried over instead of
+    # restarting on every window
+    smoother = None
+    if USE_KALMAN and FILTER_MODE == 'streaming' and not USE_HILBERT:
+        smoother = KalmanSmoother(len(channels), KALMAN_Q, KALMAN_R)
+
+    # Same for the envelope when nothing per window (Hilbert, TKEO) comes before it
+    detector = None
+    if USE_ENVELOPE and FILTER_MODE == 'streaming' and not (USE_HILBERT or USE_TKEO):
+        detector = EnvelopeDetector(sampling_rate, len(channels), ENVELOPE_METHOD)
+
+    # ---------------- Inference stage -----------------
+    def infer():
+        nonlocal pos_model, pressure_model, pending, models_of
+
+        # Meanwhile acquisition keeps the window queue filled with the newest windows
+        try:
+            bundle = startup.result()
+        except Exception as e:
+            print(f"[ERROR] Could not load the models: {e}")
+            control.stop()
+            return
+        pos_model, pressure_model = bundle['position'], bundle['pressure']
+        models_at = time.perf_counter()
+        print(f"[INFO] Models: {bundle}, ready {models_at - started_at:.2f}s after start")
+        first_prediction = True
+
+        decisions = DecisionEngine(decisions_per_window)
+
+        while True:
+            try:
+                kind, data, index, stamps = windows.get(timeout=1.0)
+            except TimeoutError:
+                continue
+            except QueueClosed:
+                break
+
+            # Swap models once the background load is done, never wait for it
+            if pending is not None and pending[1].done():
+                (what, future), pending = pending, None
+                try:
+                    loaded = future.result()
+                except Exception as e:
+                    print(f"[WARN] Could not load {what}: {e}")
+                else:
+                    if isinstance(loaded, ModelBundle):
+                        pos_model, pressure_model = loaded['position'], loaded['pressure']
+                        models_of = (loaded.user, loaded.variant)
+                    else:
+                        pos_model = loaded
+                    print(f"[INFO] Switched to {what}")
+
+            if kind != 'features':
+                window = filter_bank.zero_phase(data) if kind == 'raw' else data
+
+                # Remaining stages on channels 0-2 (Kalman and envelope on all of them in one call)
+                cols = [i for i in range(window.shape[1]) if i in [0,1,2]]
+                if USE_HILBERT == 1:
+                    for i in cols:
                         window[:, i] = hilbert_envelope(window[:, i])
-                    if USE_KALMAN == 1:
-                        window[:, i] = kalman(window[:, i])
-                    if USE_TKEO == 1:
+                if USE_KALMAN == 1 and smoother is None:
+                    window[:, cols] = kalman(window[:, cols])
+                if USE_TKEO == 1:
+                    for i in cols:
                         window[:, i] = tkeo(window[:, i])
-                    if USE_ENVELOPE == 1:
-                        # can use compute_envelope_peaks or compute_envelope
-                        pass
+                if USE_ENVELOPE == 1 and detector is None:
+                    window[:, cols] = envelope(window[:, cols], sampling_rate, ENVELOPE_METHOD)
+                for i in cols:
                     if USE_ZSCORE == 1:
                         mean = window[:, i].mean()
                         std = window[:, i].std() if window[:, i].std() != 0 else 1
                         window[:, i] = (window[:, i] - mean) / std
+                stamps.append(time.perf_counter())
 
-            # Extract features
-            feats = extract_features(window)
-
-            # Scale features for position classifier if needed
-            if USE_SCALING and pos_scaler is not None:
-                feats_pos = pos_scaler.transform(feats)
-                feats_pos = pd.DataFrame(feats_pos, columns=feats.columns) 
-            else:
-                feats_pos = feats
+                data = extract_features(window, fs=sampling_rate)
+                stamps.append(time.perf_counter())
 
-            feats_pressure = feats
+            # Predict position (scaled inside pos_model if USE_SCALING)
+            pos_pred = pos_model.predict(data)
+            stamps.append(time.perf_counter())
 
-            # Predict position
-            pos_pred = pos_clf.predict(feats_pos)
+            # Predict pressure (the pipeline scales on its own)
+            pressure_pred = pressure_model.predict(data)
+            stamps.append(time.perf_counter())
 
-            # Predict pressure
-            pressure_pred = pressure_regressor.predict(feats_pressure)
-
-            # Print original predictions
-            print(f"Original Position prediction: {pos_pred[0]}, Original Pressure prediction: {pressure_pred}")
+            if PRINT_PREDICTIONS:
+                print(f"Original Position prediction: {pos_pred[0]}, Original Pressure prediction: {pressure_pred}")
 
             # -------- Additional filtering ---------
+            # Strongest pressure only, swallow -> 'r', pressure / position consistency and
+            # holding a position until rest (see decision_engine.py)
+            decisions.decisions_per_window = decisions_per_window
+            pos_label, filtered_pressure = decisions.step(pos_pred[0], pressure_pred[0])
 
-            # Keep only the highest pressure, set others to 0
-            pressure_pred = pressure_pred[0]  
-            max_idx = np.argmax(pressure_pred)
-            filtered_pressure = np.zeros_like(pressure_pred)
-            filtered_pressure[max_idx] = pressure_pred[max_idx]
+            if PRINT_PREDICTIONS:
+                print(f"--Filtered Position prediction: {pos_label}, Filtered Pressure prediction: {filtered_pressure}")
 
-            pos_label = pos_pred[0]  # e.g. 'l', 'f', 'r', 'n', 's'
+            outputs.put((pos_label, filtered_pressure, (index, pos_pred[0], pressure_pred[0]), stamps))
 
-            # Final filter: if a class l, f or r is happening for more than 4 instances, ALL following classes
-            # are overriden to that class until a class 'n' is detected. Class 's' is an exception to this. 
+            if first_prediction:
+                first_prediction = False
+                now = time.perf_counter()
+                print(f"[INFO] Time to first prediction: {now - started_at:.2f}s "
+                      f"(imports {imported_at - started_at:.2f}s, models {models_at - started_at:.2f}s)")
 
-            # Logic: track consecutive 's' (swallow) predictions
-            if pos_label == 's':
-                swallow_count += 1
-            else:
-                swallow_count = 0  # reset if not 's'
 
-            # Reset override if position is 'n'
-            if pos_label in ['n']:
-                override_to_r = False
+    # ---------------- Output stage -----------------
+    def send():
+        while True:
+            try:
+                pos_label, filtered_pressure, (index, raw_label, raw_pressure), stamps = outputs.get(timeout=1.0)
+            except TimeoutError:
+                continue
+            except QueueClosed:
+                break
 
-            # Activate override condition if swallow_count > 3 and max_idx == 2 ('r')
-            if swallow_count >= 2 and max_idx == 2:
-                override_to_r = True
+            # Update UI with filtered predictions
+            if app is not None:
+                app.root.after(0, app.update_bulbs, pos_label)
+                app.root.after(0, app.update_sliders, filtered_pressure)
 
-            # Apply override if active
-            if override_to_r:
-                pos_label = 'r'
+            # Send filtered position and filtered pressure to every endpoint, never blocks
+            router.send(pos_label, filtered_pressure)
+            stamps.append(time.perf_counter())
+            latency.record(stamps)
+            journal.log(index, raw_label, pos_label, raw_pressure, filtered_pressure,
+                        (stamps[-1] - stamps[0]) * 1e3, (stamps[-2] - stamps[1]) * 1e3)
 
-            # Positions that don't require adjustment
-            if pos_label in ['n', 's']:
-                # do nothing, keep filtered_pressure as is
-                pass
-            else:
-                # Map position label to expected pressure index
-                pos_to_idx = {'l': 0, 'f': 1, 'r': 2}
-                expected_idx = pos_to_idx.get(pos_label, None)
-
-                if expected_idx is not None:
-                    # Check if filtered pressure corresponds to expected position
-                    if filtered_pressure.argmax() != expected_idx:
-                        # Pressure indicates a different position than predicted
-                        # Override position label to the pressure position
-                        idx_to_pos = {v: k for k, v in pos_to_idx.items()}
-                        pos_label = idx_to_pos[filtered_pressure.argmax()]
-
-            # -------- Override filtering ---------
-            # Track how many consecutive times the same 'l','f','r' position occurs
-            if pos_label in ['l', 'f', 'r']:
-                if override_active:
-                    if pos_label == override_label:
-                        override_count += 1
-                else:
-                    override_active = True
-                    override_label = pos_label
-                    override_count = 1
-            elif pos_label == 'n':
-                # Reset override on 'n'
-                override_active = False
-                override_label = None
-                override_count = 0
-
-            # If override active for more than x times, force override on all following (except 'n')
-            if override_active and override_count > 2:
-                if pos_label not in ['n']:
-                    pos_label = override_label
-
-            # Print filtered/final predictions
-            print(f"--Filtered Position prediction: {pos_label}, Filtered Pressure prediction: {filtered_pressure}")
 
-            # Update UI with filtered predictions
-            app.root.after(0, app.update_bulbs, pos_label)
-            app.root.after(0, app.update_sliders, filtered_pressure)
+    stages = [start_stage('inference', infer), start_stage('output', send)]
 
-            # Send filtered position and filtered pressure to Unity as a string like: "pos_label,filtered_pressure", "l,50,0,0"
-            pressure_values = [int(p) for p in filtered_pressure]  
-            message = f"{pos_label},{pressure_values[0]},{pressure_values[1]},{pressure_values[2]}"
-            try:
-                udp_socket.sendto(message.encode('utf-8'), (UNITY_IP, UNITY_PORT))
-            except Exception as e:
-                print(f"Error sending UDP message: {e}")
+    # ---------------- Acquisition stage -----------------
+    # Only cuts windows (and runs what has to see every sample: the causal filter and the
+    # rolling features), so it keeps pace with the device whatever inference costs
+    window_end = window_size_samples  # absolute sample index where the next window ends
+
+    # Streaming mode: samples are filtered once as they arrive and kept in their own ring
+    filtered = RingBuffer(client.ring.capacity, len(channels))
+    filtered_upto = 0
 
+    rolling = None
+    if USE_ROLLING_FEATURES:
+        if FILTER_MODE == 'streaming' and not (USE_HILBERT or USE_TKEO or USE_ZSCORE):
+            rolling = RollingFeatures(window_size_samples, len(channels), sampling_rate)
         else:
-            # Sleep shortly to avoid busy loop
-            time.sleep(0.5)
+            print("[WARN] Rolling features need FILTER_MODE = 'streaming' and no per-window stages, "
+                  "using per-window features.")
+
+    def restart_stream(start):
+        # Causal filter state only carries over contiguous samples: start again from `start`
+        nonlocal filtered_upto
+        filter_bank.reset()
+        filtered.clear(start)
+        filtered_upto = start
+        if smoother is not None:
+            smoother.reset()
+        if detector is not None:
+            detector.reset()
+        if rolling is not None:
+            rolling.reset()
+
+    while not control.stopped:
+        reporter.tick()
+        if control.paused:
+            control.wait_resumed(timeout=1.0)
+            continue
 
-if __name__ == "__main__":
-    root = tk.Tk()
-    app = EMGApp(root)
+        # Blocks until the next hop has arrived, no fixed sleeps
+        if client.wait_until(window_end, timeout=1.0):
+            # Reconfiguration from the control channel, between windows
+            for cmd, arg in control.commands():
+                if cmd == 'model':
+                    pending = (f"position model {arg}", registry.submit(load_position_model, arg, *models_of))
+                elif cmd == 'user':
+                    user, variant = arg
+                    variant = variant or (MODEL_VARIANT if user == SHARED_USER else DEFAULT_VARIANT)
+                    pending = (f"models of user {user} ({variant})", registry.request(user, variant))
+                elif cmd == 'window':
+                    window_size_samples, hop_size_samples = window_samples(
+                        arg, sampling_rate, hop_size_samples, client.ring.capacity)
+                    decisions_per_window = max(1, window_size_samples // hop_size_samples)
+                    if rolling is not None:
+                        rolling = RollingFeatures(window_size_samples, len(channels), sampling_rate)
+                    window_end = max(window_end, client.ring.oldest + window_size_samples)
+                    restart_stream(window_end - window_size_samples)
+                    print(f"[INFO] Window {window_size_samples} samples, hop {hop_size_samples} samples")
+            if client.total < window_end:
+                continue
+
+            # Stay real time: if processing fell behind by a hop or more, jump to the newest window
+            behind = client.total - window_end
+            if behind >= hop_size_samples:
+                window_end += behind - behind % hop_size_samples
+                if window_end - window_size_samples > filtered_upto:
+                    # Gap longer than a window (pause, stall): nothing to carry the filter over
+                    restart_stream(window_end - window_size_samples)
+
+            window_start = window_end - window_size_samples
+            cut = time.perf_counter()
+            stamps = [client.arrival_time(window_end - 1) or cut, cut]
+
+            # Notch + bandpass on all channels at once (new arrays, the rings are not modified).
+            # Zero-phase filtering is per window, so it runs in the inference stage
+            if FILTER_MODE == 'streaming':
+                new_samples = client.ring.window(filtered_upto, window_end - filtered_upto)
+                new_filtered = filter_bank.process(new_samples)
+                if smoother is not None:
+                    new_filtered = smoother.process(new_filtered)
+                if detector is not None:
+                    new_filtered = detector.process(new_filtered)
+                filtered.write(new_filtered)
+                filtered_upto = window_end
+                if rolling is not None:
+                    stamps.append(time.perf_counter())
+                    item = ('features', rolling.update(new_filtered), window_end, stamps)
+                    stamps.append(time.perf_counter())
+                else:
+                    item = ('filtered', filtered.window(window_start, window_size_samples).copy(), window_end, stamps)
+            else:
+                item = ('raw', np.array(client.ring.window(window_start, window_size_samples)), window_end, stamps)
+            window_end += hop_size_samples
+
+            windows.put(item)
+
+    windows.close()
+    outputs.close()
+    for stage in stages:
+        stage.join(timeout=2.0)
+    print(f"[INFO] Queues - {format_stats([windows, outputs])}")
+    latency.close()
+    journal.close()
+    print(f"[INFO] Outputs - {router.report()}")
+    router.close()
+    client.stop()
+    registry.close()
+    print("Online classification stopped.")
 
-    threading.Thread(target=run_model_loop, args=(app,), daemon=True).start()
-    root.mainloop()
+if __name__ == "__main__":
+    headless = HEADLESS or '--headless' in sys.argv
+    # Console commands as well when run headless from a terminal
+    control = ControlChannel(stdin=headless and sys.stdin is not None and sys.stdin.isatty()).start()
+
+    if headless:
+        try:
+            run_model_loop(None, control)
+        finally:
+            control.close()
+    else:
+        import tkinter as tk
+        root = tk.Tk()
+        app = EMGApp(root)
+
+        # Closing the window stops the loop; a stop from the control channel closes the window
+        root.protocol("WM_DELETE_WINDOW", control.stop)
+
+        def close_when_stopped():
+            if control.stopped:
+                root.destroy()
+            else:
+                root.after(200, close_when_stopped)
+
+        model_thread = threading.Thread(target=run_model_loop, args=(app, control), daemon=True)
+        model_thread.start()
+        close_when_stopped()
+        root.mainloop()
+        control.close()
+        model_thread.join(timeout=2.0)
@@ -1,13 +1,14 @@
 
-import socket
+from output_router import OutputRouter
 
 UNITY_IP = "192.168.1.40"  # Use the Quest or Unity PC IP if not running on the same machine
 UNITY_PORT = 5052
+# Same message to every endpoint, e.g. add "127.0.0.1:5052/binary" for the editor (see output_router.py)
+UNITY_ENDPOINTS = [f"{UNITY_IP}:{UNITY_PORT}/text"]
 
 pressure = [40,0,0]
 
-# Create UDP socket
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+router = OutputRouter(UNITY_ENDPOINTS)
 
 print("Press keys to send to Unity. Press ESC to quit.")
 
@@ -20,15 +21,10 @@ try:
             break
 
         if key:
-            message = key[0]  # Just the first character
-
-            message = f"{message},{pressure[0]},{pressure[1]},{pressure[2]}"
-            try:
-                sock.sendto(message.encode('utf-8'), (UNITY_IP, UNITY_PORT))
-            except Exception as e:
-                print(f"Error sending UDP message: {e}")
+            router.send(key[0], pressure)  # Just the first character, "l,40,0,0"
 
 except KeyboardInterrupt:
     print("\nStopped by user.")
 
-sock.close()
+print(router.report())
+router.close()
@@ -0,0 +1,227 @@
+# -------------------------- Per-stage benchmark
+# Times every stage of the online pipeline on its own, for the window sizes the scripts
+# use (125 / 250 / 375 samples at 250 Hz for OpenBCI, 1875 at 1500 Hz for Noraxon) and
+# 3, 4 and 8 channels:
+#
+#   notch, bandpass          zero-phase (filtfilt) per window, as in FILTER_MODE = 'zero_phase'
+#   filter_stream            causal FilterBank.process of one hop (window / 10)
+#   hilbert, tkeo, kalman    the per-window stages of Noraxon_online_classification.py
+#   envelope                 emg_envelope (rectify) over the window
+#   feature_<NAME>           extract_features with only that feature; features_all = all nine
+#   scaler, rf_predict_fast, rf_predict_sklearn, regressor_predict, decision, udp_encode(_binary)
+#                            per prediction; they do not depend on the window, so they are
+#                            timed once on the 27 features of the Noraxon models (the forest
+#                            through FastForest, what the scripts run, and through sklearn)
+#
+# Each entry is the median and p95 of single calls (in us) over `BUDGET` s. Results go to
+# a JSON file; with a baseline file, every entry is compared, and an entry slower than
+# the baseline by more than `threshold` is timed `CONFIRM_RUNS` more times. Only if it
+# stays that slow every time is it reported as a regression (exit code 1), so a hot-path
+# regression shows up as a number and a noisy moment on the machine does not. Timings
+# only compare on the same machine: make the baseline there.
+#
+#   python benchmark_stages.py                        run, write bench_results.json
+#   python benchmark_stages.py --save-baseline        run, write bench_baseline.json
+#   python benchmark_stages.py results.json baseline.json [threshold, default 1.25]
+
+import json
+import platform
+import sys
+import time
+import warnings
+import numpy as np
+import scipy
+import sklearn
+from scipy.signal import filtfilt
+from emg_filters import FilterBank
+from emg_features import FEATURE_NAMES, extract_features, feature_columns
+from emg_envelope import envelope
+from fast_model import CompiledModel
+from decision_engine import DecisionEngine
+from unity_protocol import encode_text, encode_binary
+from Noraxon_online_classification import hilbert_envelope, tkeo, kalman
+
+WINDOWS = (125, 250, 375, 1875)
+CHANNELS = (3, 4, 8)
+MODEL = "../notebooks/models/4_classes_cont_01_07.pkl"
+SCALER = "../notebooks/models/4_classes_scaler_cont_01_07.pkl"
+REGRESSOR = "../notebooks/models/regressor_01_07.joblib"
+RESULTS_FILE = "bench_results.json"
+BASELINE_FILE = "bench_baseline.json"
+THRESHOLD = 1.25
+BUDGET = 0.25          # s of calls per entry
+CONFIRM_RUNS = 3       # re-timings an entry over the threshold must fail as well
+
+
+def sampling_rate(window):
+    return 1500 if window >= 1875 else 250
+
+
+def time_call(fn, budget=BUDGET, min_calls=20, max_calls=5000):
+    """(median, p95) in us of single calls, after one warm-up call."""
+    fn()
+    times = []
+    end = time.perf_counter() + budget
+    while len(times) < min_calls or (len(times) < max_calls and time.perf_counter() < end):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times = np.array(times) * 1e6
+    return float(np.median(times)), float(np.percentile(times, 95))
+
+
+def window_stages(window, n_channels, rng):
+    """{stage: callable} for one window size and channel count."""
+    fs = sampling_rate(window)
+    x = rng.standard_normal((window, n_channels)) * 50
+    bank = FilterBank(fs=fs, n_channels=n_channels)
+    (notch_b, notch_a), (band_b, band_a) = bank.stages
+    hop = max(1, window // 10)
+    stream = FilterBank(fs=fs, n_channels=n_channels)
+
+    stages = {
+        'notch': lambda: filtfilt(notch_b, notch_a, x, axis=0),
+        'bandpass': lambda: filtfilt(band_b, band_a, x, axis=0),
+        'filter_stream': lambda: stream.process(x[:hop]),
+        'hilbert': lambda: [hilbert_envelope(x[:, i]) for i in range(n_channels)],
+        'tkeo': lambda: [tkeo(x[:, i]) for i in range(n_channels)],
+        'kalman': lambda: kalman(x),
+        'envelope': lambda: envelope(x, fs),
+        'features_all': lambda: extract_features(x, fs),
+    }
+    for name in FEATURE_NAMES:
+        stages[f'feature_{name}'] = lambda name=name: extract_features(x, fs, features=(name,))
+    return stages
+
+
+def prediction_stages(rng):
+    """{stage: callable} for the per-prediction stages (independent of the window)."""
+    import joblib
+    columns = feature_columns(['ch_1', 'ch_2', 'ch_3'])
+    model = CompiledModel(joblib.load(MODEL), joblib.load(SCALER), columns=columns)
+    regressor = CompiledModel(joblib.load(REGRESSOR), columns=columns)
+    row = extract_features(rng.standard_normal((1875, 3)) * 50, 1500)
+    scaled = model.transform(row).copy()
+    engine = DecisionEngine()
+    pressure = np.array([26.0, 48.5, 69.0])
+    # Fitted on a DataFrame, timed on arrays as CompiledModel calls it
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+    return {
+        'scaler': lambda: model.transform(row),
+        'rf_predict_fast': lambda: model.engine.predict(scaled),
+        'rf_predict_sklearn': lambda: model.estimator.predict(scaled),
+        'regressor_predict': lambda: regressor.predict(row),
+        'decision': lambda: engine.step('l', pressure),
+        'udp_encode': lambda: encode_text('l', pressure),
+        'udp_encode_binary': lambda: encode_binary('l', pressure, 1),
+    }
+
+
+def run(windows=WINDOWS, channels=CHANNELS, seed=0):
+    rng = np.random.default_rng(seed)
+    results = []
+    for window in windows:
+        for n_channels in channels:
+            for stage, fn in window_stages(window, n_channels, rng).items():
+                median, p95 = time_call(fn)
+                results.append({'stage': stage, 'window': window, 'channels': n_channels,
+                                'median_us': median, 'p95_us': p95})
+            print(f"window {window:5d} x {n_channels} channels done")
+    for stage, fn in prediction_stages(rng).items():
+        median, p95 = time_call(fn)
+        results.append({'stage': stage, 'window': None, 'channels': 3, 'median_us': median, 'p95_us': p95})
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'sklearn': sklearn.__version__,
+            'machine': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def _key(entry):
+    return entry['stage'], entry['window'], entry['channels']
+
+
+def compare(current, baseline, threshold=THRESHOLD):
+    """Print the entries that moved by more than `threshold` either way against the baseline;
+    returns the slower ones as (entry, ratio)."""
+    base = {_key(e): e for e in baseline['results']}
+    regressions = []
+    compared = 0
+    print(f"{'stage':<20}{'window':>7}{'ch':>4}{'baseline us':>13}{'now us':>10}{'ratio':>8}")
+    for entry in current['results']:
+        old = base.get(_key(entry))
+        if old is None:
+            continue
+        compared += 1
+        ratio = entry['median_us'] / old['median_us'] if old['median_us'] else float('inf')
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions.append((entry, ratio))
+        elif ratio < 1 / threshold:
+            flag = '  faster'
+        else:
+            continue
+        window = entry['window'] if entry['window'] is not None else '-'
+        print(f"{entry['stage']:<20}{window:>7}{entry['channels']:>4}"
+              f"{old['median_us']:>13.1f}{entry['median_us']:>10.1f}{ratio:>8.2f}{flag}")
+    print(f"{compared} entries compared with the baseline ({baseline['meta']['time']})")
+    return regressions
+
+
+def confirm(regressions, baseline, threshold=THRESHOLD, runs=CONFIRM_RUNS, seed=1):
+    """Time every flagged entry `runs` more times; keeps those still slower than `threshold`
+    in all of them, as (entry, ratio of the fastest re-timing)."""
+    base = {_key(e): e for e in baseline['results']}
+    rng = np.random.default_rng(seed)
+    stages = {}                                 # (window, channels) -> {stage: callable}
+    confirmed = []
+    for entry, _ in regressions:
+        group = (entry['window'], entry['channels'])
+        if group not in stages:
+            stages[group] = prediction_stages(rng) if entry['window'] is None else \
+                window_stages(entry['window'], entry['channels'], rng)
+        fn = stages[group][entry['stage']]
+        ratio = min(time_call(fn)[0] for _ in range(runs)) / base[_key(entry)]['median_us']
+        window = entry['window'] if entry['window'] is not None else '-'
+        if ratio > threshold:
+            confirmed.append((entry, ratio))
+            print(f"{entry['stage']:<20}{window:>7}{entry['channels']:>4}  confirmed, x{ratio:.2f} at best")
+        else:
+            print(f"{entry['stage']:<20}{window:>7}{entry['channels']:>4}  not confirmed (x{ratio:.2f}), noise")
+    return confirmed
+
+
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    save_baseline = '--save-baseline' in sys.argv
+    out = BASELINE_FILE if save_baseline else (args[0] if args else RESULTS_FILE)
+    baseline_path = None if save_baseline else (args[1] if len(args) > 1 else BASELINE_FILE)
+    threshold = float(args[2]) if len(args) > 2 else THRESHOLD
+
+    results = run()
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f"Wrote {len(results['results'])} timings to {out}")
+
+    if baseline_path:
+        try:
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print(f"[INFO] No baseline {baseline_path} (create one with --save-baseline)")
+            sys.exit(0)
+        regressions = compare(results, baseline, threshold)
+        if regressions:
+            print(f"Re-timing {len(regressions)} flagged stage(s) {CONFIRM_RUNS} times...")
+            regressions = confirm(regressions, baseline, threshold)
+        if regressions:
+            print(f"[WARN] {len(regressions)} stage(s) slower than x{threshold:g} the baseline")
+            sys.exit(1)
+        print("No regressions.")
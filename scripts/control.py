@@ -0,0 +1,186 @@
+# -------------------------- Control channel
+# Stop / pause / reconfigure a running classifier without polling the keyboard on the
+# hot path. Commands arrive from any of:
+#   - SIGINT / SIGTERM (SIGBREAK on Windows)      -> stop
+#   - UDP text datagrams on 127.0.0.1:CONTROL_PORT (reply "ok ..." / "error ...")
+#   - stdin lines, if enabled (interactive runs)
+#
+#   stop | pause | resume | model <file> | user <id> [variant] | window <seconds> [hop seconds]
+#
+# The loops only read two Events (stopped, paused), so the per-packet cost is an
+# attribute lookup. Reconfiguration commands are queued and picked up with commands()
+# once per window.
+#
+#   python control.py stop                  send a command to a running script
+#   python control.py window 1.0 0.1
+#   python control.py user 3
+
+import queue
+import signal
+import socket
+import sys
+import threading
+
+CONTROL_IP = "127.0.0.1"
+CONTROL_PORT = 12346
+
+
+class ControlChannel:
+    def __init__(self, port=CONTROL_PORT, ip=CONTROL_IP, stdin=False, handle_signals=True):
+        self.port = port
+        self.ip = ip
+        self.use_stdin = stdin
+        self.handle_signals = handle_signals
+        self._stop = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._commands = queue.SimpleQueue()
+        self._callbacks = []
+        self._sock = None
+
+    # ---------------- Lifecycle -----------------
+    def start(self):
+        if self.handle_signals and threading.current_thread() is threading.main_thread():
+            for name in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+                if hasattr(signal, name):
+                    signal.signal(getattr(signal, name), self._on_signal)
+        if self.port:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.bind((self.ip, self.port))
+            self._sock.settimeout(0.5)
+            threading.Thread(target=self._serve_udp, daemon=True).start()
+            print(f"[INFO] Control port on {self.ip}:{self.port}")
+        if self.use_stdin:
+            threading.Thread(target=self._serve_stdin, daemon=True).start()
+        return self
+
+    def on_stop(self, callback):
+        """Call `callback()` once when a stop is requested (e.g. close a GUI)."""
+        self._callbacks.append(callback)
+
+    def stop(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._running.set()               # wake anyone waiting in wait_resumed()
+        for callback in self._callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[WARN] Stop callback failed: {e}")
+
+    def close(self):
+        self.stop()
+        if self._sock is not None:
+            self._sock.close()
+
+    # ---------------- State for the loops -----------------
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def wait_resumed(self, timeout=None):
+        """Block while paused. True when running again (or stopping)."""
+        return self._running.wait(timeout)
+
+    def wait_stopped(self, timeout=None):
+        return self._stop.wait(timeout)
+
+    def commands(self):
+        """Queued reconfiguration commands as (name, args) tuples, oldest first."""
+        pending = []
+        while not self._commands.empty():
+            pending.append(self._commands.get_nowait())
+        return pending
+
+    # ---------------- Command handling -----------------
+    def handle(self, line):
+        """Apply one text command, returns the reply."""
+        parts = line.strip().split()
+        if not parts:
+            return "error empty command"
+        name, args = parts[0].lower(), parts[1:]
+        if name in ('stop', 'quit', 'exit'):
+            self.stop()
+        elif name == 'pause':
+            self._running.clear()
+        elif name == 'resume':
+            self._running.set()
+        elif name == 'model':
+            if len(args) != 1:
+                return "error usage: model <file>"
+            self._commands.put(('model', args[0]))
+        elif name == 'user':
+            if len(args) not in (1, 2):
+                return "error usage: user <id> [variant]"
+            self._commands.put(('user', (args[0], args[1] if len(args) > 1 else None)))
+        elif name == 'window':
+            try:
+                values = [float(a) for a in args]
+            except ValueError:
+                values = []
+            if len(values) not in (1, 2) or min(values) <= 0:
+                return "error usage: window <seconds> [hop seconds]"
+            self._commands.put(('window', tuple(values)))
+        else:
+            return f"error unknown command '{name}'"
+        print(f"[INFO] Control: {' '.join(parts)}")
+        return f"ok {name}"
+
+    def _on_signal(self, signum, frame):
+        print(f"[INFO] Signal {signum} received, stopping...")
+        self.stop()
+
+    def _serve_udp(self):
+        while not self._stop.is_set():
+            try:
+                data, addr = self._sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            reply = self.handle(data.decode('utf-8', errors='replace'))
+            try:
+                self._sock.sendto(reply.encode(), addr)
+            except OSError:
+                pass
+
+    def _serve_stdin(self):
+        for line in sys.stdin:
+            if line.strip():
+                print(self.handle(line))
+            if self._stop.is_set():
+                break
+
+
+def window_samples(args, fs, hop, limit=None):
+    """(window, hop) in samples for the (seconds[, hop seconds]) of a 'window' command."""
+    window = max(1, int(round(args[0] * fs)))
+    if limit:
+        window = min(window, limit)
+    if len(args) > 1:
+        hop = max(1, int(round(args[1] * fs)))
+    return window, hop
+
+
+def send_command(command, port=CONTROL_PORT, ip=CONTROL_IP, timeout=1.0):
+    """Send one command to a running script and return its reply (None if nobody answered)."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.sendto(command.encode(), (ip, port))
+        try:
+            return sock.recvfrom(1024)[0].decode()
+        except socket.timeout:
+            return None
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("usage: python control.py stop | pause | resume | model <file> | user <id> [variant] | window <seconds> [hop]")
+        sys.exit(1)
+    reply = send_command(' '.join(sys.argv[1:]))
+    print(reply if reply is not None else f"[WARN] No reply on port {CONTROL_PORT}")
@@ -0,0 +1,162 @@
+# -------------------------- Decision engine
+# Post-processing of the raw (position, pressure) predictions, as a small state machine.
+# Rules run in this order on every prediction (any of them can be switched off):
+#
+#   'swallow'   after `swallow_windows` windows of consecutive swallow ('s') predictions
+#               with the highest pressure on the swallow target ('r'), the label stays on
+#               the target until a rest ('n') prediction
+#   'pressure'  a pressure position ('l', 'f', 'r') whose pressure sensor is not the
+#               strongest one is replaced by the position of the strongest sensor
+#   'hold'      a pressure position seen for more than `hold_windows` windows is held
+#               for every following prediction (except rest) until a rest prediction
+#
+# The pressure output always keeps only its largest value, the others are set to 0.
+# Thresholds are in windows; with overlapping windows (a prediction every hop) they are
+# scaled by `decisions_per_window` so they still cover the same stretch of time.
+#
+# step() is the streaming API for the live classifier. replay() runs a whole recorded
+# sequence through the same rules without any per-prediction NumPy work, so threshold
+# sweeps over hours of logged predictions take seconds.
+#
+#   python decision_engine.py run.log [swallow windows ...] [--hold hold windows ...]
+#
+# replays the raw predictions of a run for every combination of thresholds and prints
+# the label counts. run.log is a prediction journal (.pjr, see prediction_journal.py)
+# or console output of the online classifier ("Original Position prediction: ...").
+
+import collections
+import itertools
+import re
+import sys
+import time
+import numpy as np
+
+RULES = ('swallow', 'pressure', 'hold')
+PRESSURE_POSITIONS = ('l', 'f', 'r')   # position of each pressure output, in output order
+
+
+class DecisionEngine:
+    def __init__(self, decisions_per_window=1, swallow_windows=2, hold_windows=2, rules=RULES,
+                 positions=PRESSURE_POSITIONS, rest='n', swallow='s', swallow_target='r'):
+        unknown = set(rules) - set(RULES)
+        if unknown:
+            raise ValueError(f"Unknown rules {sorted(unknown)}, expected some of {RULES}")
+        self.decisions_per_window = decisions_per_window
+        self.swallow_windows = swallow_windows
+        self.hold_windows = hold_windows
+        self.rules = frozenset(rules)
+        self.positions = tuple(positions)
+        self.rest = rest
+        self.swallow = swallow
+        self.swallow_target = swallow_target
+        self._target_idx = self.positions.index(swallow_target)
+        self.reset()
+
+    def reset(self):
+        self.swallow_count = 0
+        self.swallow_override = False
+        self.hold_label = None                # None while no position is held
+        self.hold_count = 0
+
+    def _decide(self, label, max_idx, strongest):
+        """Next label from the model label, the argmax of the raw pressure and the argmax of
+        the filtered pressure (they differ only if every pressure is negative)."""
+        if 'swallow' in self.rules:
+            self.swallow_count = self.swallow_count + 1 if label == self.swallow else 0
+            if label == self.rest:
+                self.swallow_override = False
+            if (self.swallow_count >= self.swallow_windows * self.decisions_per_window
+                    and max_idx == self._target_idx):
+                self.swallow_override = True
+            if self.swallow_override:
+                label = self.swallow_target
+
+        if 'pressure' in self.rules and label in self.positions:
+            label = self.positions[strongest]
+
+        if 'hold' in self.rules:
+            if label in self.positions:
+                if self.hold_label is None:
+                    self.hold_label = label
+                    self.hold_count = 1
+                elif label == self.hold_label:
+                    self.hold_count += 1
+            elif label == self.rest:
+                self.hold_label = None
+                self.hold_count = 0
+            if (self.hold_label is not None and self.hold_count > self.hold_windows * self.decisions_per_window
+                    and label != self.rest):
+                label = self.hold_label
+        return label
+
+    def step(self, label, pressure):
+        """(final label, filtered pressure) for one prediction; pressure is one row of outputs."""
+        pressure = np.asarray(pressure)
+        max_idx = int(np.argmax(pressure))
+        filtered = np.zeros_like(pressure)
+        filtered[max_idx] = pressure[max_idx]
+        return self._decide(label, max_idx, int(filtered.argmax())), filtered
+
+    def replay(self, labels, pressures, reset=True):
+        """(final labels, filtered pressures) for a whole sequence, same as step() in a loop."""
+        if reset:
+            self.reset()
+        pressures = np.asarray(pressures)
+        rows = np.arange(len(pressures))
+        max_idx = np.argmax(pressures, axis=1)
+        filtered = np.zeros_like(pressures)
+        filtered[rows, max_idx] = pressures[rows, max_idx]
+        strongest = np.argmax(filtered, axis=1)
+
+        decide = self._decide
+        out = [decide(label, m, s) for label, m, s in zip(list(labels), max_idx.tolist(), strongest.tolist())]
+        return np.array(out, dtype=object), filtered
+
+
+# ---------------- Log replay -----------------
+LOG_LINE = re.compile(r"Original Position prediction: (\S+), Original Pressure prediction: \[+([^\]]*)\]")
+
+
+def load_log(path):
+    """(labels, pressures) from a prediction journal or the 'Original ... prediction' lines
+    of a classifier log."""
+    if path.endswith('.pjr'):
+        from prediction_journal import read_journal
+        records = read_journal(path)[1]
+        return [label.decode() for label in records['raw']], records['pressure'].astype(float)
+    labels, pressures = [], []
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            m = LOG_LINE.search(line)
+            if m:
+                labels.append(m.group(1))
+                pressures.append([float(v) for v in m.group(2).replace(',', ' ').split()])
+    return labels, np.array(pressures)
+
+
+def sweep(labels, pressures, swallow_windows=(2,), hold_windows=(2,), **kwargs):
+    """{(swallow, hold): final labels} for every combination of thresholds."""
+    results = {}
+    for s, h in itertools.product(swallow_windows, hold_windows):
+        engine = DecisionEngine(swallow_windows=s, hold_windows=h, **kwargs)
+        results[s, h] = engine.replay(labels, pressures)[0]
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("usage: python decision_engine.py run.log [swallow windows ...] [--hold hold windows ...]")
+        sys.exit(1)
+    args = sys.argv[2:]
+    hold = [float(v) for v in args[args.index('--hold') + 1:]] if '--hold' in args else [2]
+    swallow = [float(v) for v in (args[:args.index('--hold')] if '--hold' in args else args)] or [2]
+
+    labels, pressures = load_log(sys.argv[1])
+    print(f"{len(labels)} predictions, raw: {dict(sorted(collections.Counter(labels).items()))}")
+    start = time.perf_counter()
+    results = sweep(labels, pressures, swallow, hold)
+    elapsed = time.perf_counter() - start
+    for (s, h), final in results.items():
+        counts = dict(sorted(collections.Counter(final.tolist()).items()))
+        print(f"swallow {s:g} hold {h:g}: {counts}")
+    print(f"{len(results)} replays in {elapsed:.2f}s")
@@ -0,0 +1,180 @@
+# -------------------------- Device stand-ins
+# Replays recordings as the devices would stream them, so the online scripts can run
+# (and be load-tested) without hardware:
+#
+#   noraxon   MR32 CSV export (data_Noraxon/*.csv) served on http://127.0.0.1:9220/samples.
+#             Every GET drains what the "device" recorded since the previous GET, in the
+#             JSON layout of the MR3 stream ({"channels": [{"samples": [...]}, ...]})
+#   openbci   OpenBCI recordings (data_OpenBCI/**/*.csv, tab separated) sent as UDP
+#             datagrams to 127.0.0.1:12345, JSON like the OpenBCI GUI or the binary
+#             format of openbci_udp.py
+#
+# speed: 1 = real time, 10 = ten times faster, max = as fast as the consumer takes it
+# (noraxon: every GET gets the next `max_chunk` samples; openbci: no pause between
+# datagrams). Recordings loop until Ctrl+C. OpenBCI sends the first 3 EXG channels
+# unless --channels says otherwise (real_time_7_classes.py reads 4).
+#
+#   python device_replay.py noraxon [file.csv] [speed]
+#   python device_replay.py openbci <file.csv or directory> [speed] [json|binary] [--channels N]
+
+import glob
+import io
+import json
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+from openbci_udp import UDP_IP, UDP_PORT, load_recording, new_sender_id, send_samples
+
+NORAXON_FILE = "../data_Noraxon/Noraxon_Test.csv"
+NORAXON_PORT = 9220
+
+
+def parse_speed(text):
+    """1.0, 10.0, ... or 0.0 for 'max'."""
+    return 0.0 if str(text).lower() in ('max', '0', 'inf') else float(text)
+
+
+def load_mr32(path):
+    """(sampling rate, channel names, (n, n_channels) samples) of an MR32 CSV export.
+
+    Header lines up to the column names ("Frequency;1500" among them), then
+    semicolon-separated rows with decimal commas; the first column is time.
+    """
+    fs = None
+    with open(path, encoding='utf-8-sig') as f:
+        for line in f:
+            if line.startswith('Frequency;'):
+                fs = float(line.split(';')[1].replace(',', '.'))
+            if line.startswith('"Time'):
+                names = [n.strip('"').split(',')[0] for n in line.strip().split(';')[1:]]
+                break
+        else:
+            raise ValueError(f"{path}: no column header found")
+        body = f.read().replace(',', '.')
+    samples = np.loadtxt(io.StringIO(body), delimiter=';', ndmin=2)[:, 1:]
+    return fs, names, samples
+
+
+class NoraxonReplay:
+    def __init__(self, samples, fs, speed=1.0, port=NORAXON_PORT, ip='127.0.0.1', max_chunk=None):
+        self.samples = samples
+        self.fs = fs
+        self.speed = speed
+        self.max_chunk = max_chunk or int(fs)      # samples per GET at max speed
+        self._lock = threading.Lock()
+        self.served = 0                            # samples handed out so far (absolute)
+        self.requests = 0
+        self._start = None
+
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'          # keep-alive, like the client expects
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/samples':
+                    self.send_error(404)
+                    return
+                body = replay.drain()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((ip, port), Handler)
+        self.server.daemon_threads = True
+
+    def drain(self):
+        """JSON body with every sample 'recorded' since the previous call."""
+        with self._lock:
+            now = time.perf_counter()
+            if self._start is None:
+                self._start = now                  # the recording starts with the first GET
+            if self.speed:
+                due = int((now - self._start) * self.fs * self.speed)
+            else:
+                due = self.served + self.max_chunk
+            first, self.served = self.served, max(self.served, due)
+            self.requests += 1
+        idx = np.arange(first, self.served) % len(self.samples)   # loops over the recording
+        block = self.samples[idx]
+        return json.dumps({'channels': [{'samples': block[:, c].tolist()}
+                                        for c in range(block.shape[1])]}).encode()
+
+    def serve(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run_noraxon(path=NORAXON_FILE, speed=1.0, port=NORAXON_PORT):
+    fs, names, samples = load_mr32(path)
+    print(f"Serving {path} ({len(samples)} samples, {len(names)} channels {names}, {fs:g} Hz) "
+          f"on http://127.0.0.1:{port}/samples at {'max speed' if not speed else f'x{speed:g}'}")
+    replay = NoraxonReplay(samples, fs, speed, port).serve()
+    start = time.perf_counter()
+    try:
+        while True:
+            time.sleep(5.0)
+            elapsed = time.perf_counter() - start
+            print(f"[INFO] {replay.requests} GETs, {replay.served} samples served "
+                  f"({replay.served / elapsed:.0f} samples/s)")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        replay.close()
+
+
+def run_openbci(path, speed=1.0, fmt='json', n_channels=3):
+    files = sorted(glob.glob(os.path.join(path, '**', '*.csv'), recursive=True)) if os.path.isdir(path) else [path]
+    if not files:
+        print(f"[WARN] No recordings in {path}")
+        return
+    recordings = [load_recording(f, n_channels) for f in files]
+    print(f"Sending {len(files)} recording(s), {sum(len(r) for r in recordings)} samples x {n_channels} channels, to "
+          f"{UDP_IP}:{UDP_PORT} ({fmt}, {'max speed' if not speed else f'x{speed:g}'})")
+    start = time.perf_counter()
+    sent = 0
+    seq = 0        # one binary sequence (and sender id) across recordings and loops
+    sender = new_sender_id()
+    try:
+        while True:
+            for samples in recordings:
+                seq = send_samples(samples, fmt, speed, seq=seq, sender=sender)
+                sent += len(samples)
+            elapsed = time.perf_counter() - start
+            print(f"[INFO] {sent} samples sent ({sent / elapsed:.0f} samples/s)")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in ('noraxon', 'openbci'):
+        print("usage: python device_replay.py noraxon [file.csv] [speed]\n"
+              "       python device_replay.py openbci <file.csv or directory> [speed] [json|binary] [--channels N]\n"
+              "speed: 1 = real time, 10, ..., max")
+        sys.exit(1)
+    args = sys.argv[2:]
+    n_channels = 3
+    if '--channels' in args:
+        at = args.index('--channels')
+        n_channels = int(args[at + 1])
+        del args[at:at + 2]
+    if sys.argv[1] == 'noraxon':
+        run_noraxon(args[0] if args else NORAXON_FILE, parse_speed(args[1]) if len(args) > 1 else 1.0)
+    else:
+        if not args:
+            print("[WARN] openbci needs a recording or a directory of recordings")
+            sys.exit(1)
+        run_openbci(args[0], parse_speed(args[1]) if len(args) > 1 else 1.0,
+                    args[2] if len(args) > 2 else 'json', n_channels)
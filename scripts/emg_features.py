@@ -0,0 +1,221 @@
+# -------------------------- Feature extraction
+# One kernel for the time/frequency features used by all the trained models.
+# Takes a (samples, channels) window or a (windows, samples, channels) batch and
+# returns a plain float array in the column order of the training notebooks:
+# ch_1_RMS, ch_1_RMS_SD, ..., ch_1_MF, ch_2_RMS, ...
+#
+# The data is laid out channel-major once, so every reduction runs along the last
+# (contiguous) axis and gives the same numbers as the old per-channel helpers. The
+# mean, the deviations, |x| and the single rFFT are shared between features.
+
+import numpy as np
+from ring_buffer import RingBuffer
+from emg_spectral import SlidingSpectrum, frequency_grid, mean_frequency_from_power
+
+FEATURE_NAMES = ('RMS', 'RMS_SD', 'ZC', 'WL', 'MAV', 'STD', 'VAR', 'IAV', 'MF')
+
+
+def feature_columns(channels, features=FEATURE_NAMES):
+    return [f"{ch}_{feat}" for ch in channels for feat in features]
+
+
+def zero_crossings(x, mode='signbit'):
+    """Sign changes along the last axis.
+
+    'signbit': zero counts as positive (Noraxon scripts / notebooks)
+    'sign':    zeros take the previous sign, a leading zero counts as a change
+               (the loop used in the OpenBCI real-time scripts)
+    """
+    if mode == 'signbit':
+        signs = np.signbit(x)
+        return np.count_nonzero(signs[..., 1:] != signs[..., :-1], axis=-1)
+
+    signs = np.sign(x)
+    filled = signs.copy()
+    filled[..., 0] = np.where(signs[..., 0] == 0, 1, signs[..., 0])
+    # Forward-fill zeros with the last non-zero sign
+    idx = np.where(filled != 0, np.arange(x.shape[-1]), 0)
+    np.maximum.accumulate(idx, axis=-1, out=idx)
+    filled = np.take_along_axis(filled, idx, axis=-1)
+    filled[..., 0] = signs[..., 0]
+    return np.count_nonzero(filled[..., 1:] != filled[..., :-1], axis=-1)
+
+
+def mean_frequency(x, fs):
+    """Power-weighted mean frequency along the last axis (0 for an all-zero signal)."""
+    power = np.abs(np.fft.rfft(x, axis=-1)) ** 2
+    return mean_frequency_from_power(power, frequency_grid(x.shape[-1], fs))
+
+
+def extract_features(window, fs, features=FEATURE_NAMES, zc_mode='signbit'):
+    """Features for a (samples, channels) window -> (channels * n_features,) array,
+    or for a (windows, samples, channels) batch -> (windows, channels * n_features)."""
+    x = np.asarray(window, dtype=float)
+    single = x.ndim == 2
+    if single:
+        x = x[None]
+    # (windows, channels, samples), contiguous along samples
+    x = np.ascontiguousarray(np.swapaxes(x, 1, 2))
+    n = x.shape[-1]
+
+    out = np.empty(x.shape[:2] + (len(features),))
+    wanted = set(features)
+
+    if wanted & {'RMS_SD', 'STD', 'VAR'}:
+        dev = x - np.mean(x, axis=-1, keepdims=True)
+        var = np.mean(dev * dev, axis=-1)
+        std = np.sqrt(var)
+    if wanted & {'MAV', 'IAV'}:
+        abs_x = np.abs(x)
+        iav = np.sum(abs_x, axis=-1)
+
+    for k, name in enumerate(features):
+        if name == 'RMS':
+            out[..., k] = np.sqrt(np.mean(x * x, axis=-1))
+        elif name in ('RMS_SD', 'STD'):
+            out[..., k] = std
+        elif name == 'VAR':
+            out[..., k] = var
+        elif name == 'ZC':
+            out[..., k] = zero_crossings(x, zc_mode)
+        elif name == 'WL':
+            out[..., k] = np.sum(np.abs(np.diff(x, axis=-1)), axis=-1)
+        elif name == 'MAV':
+            out[..., k] = iav / n
+        elif name == 'IAV':
+            out[..., k] = iav
+        elif name == 'MF':
+            out[..., k] = mean_frequency(x, fs)
+        else:
+            raise ValueError(f"Unknown feature '{name}'")
+
+    out = out.reshape(out.shape[0], -1)
+    return out[0] if single else out
+
+
+# -------------------------- Rolling features
+# With overlapping windows most of each window was already seen. RollingFeatures keeps
+# running sums of the per-sample terms (x, x^2, |x|, |x[i] - x[i-1]|, sign change) for
+# the trailing window and only adds the samples that enter and subtracts the ones that
+# leave, so an update costs O(hop). The sums are recomputed from the stored terms every
+# `resync_every` samples to stop floating-point drift (amortised O(hop) as well).
+# MF comes from a SlidingSpectrum of the same samples (emg_spectral).
+#
+# Only meaningful when the samples reaching the window do not change afterwards, i.e.
+# causal processing (FilterBank.process), not filtfilt per window. In 'sign' zero-crossing
+# mode zeros are filled from the sign before the window, so a window that starts on exact
+# zeros can differ from extract_features by one crossing.
+
+X, X2, ABS, DIFF, CROSS = range(5)
+
+
+class RollingFeatures:
+    def __init__(self, window_size, n_channels, fs, features=FEATURE_NAMES,
+                 zc_mode='signbit', resync_every=None):
+        self.window_size = window_size
+        self.n_channels = n_channels
+        self.fs = fs
+        self.features = tuple(features)
+        self.zc_mode = zc_mode
+        self.resync_every = resync_every or window_size
+        # Per-sample terms, (window_size, 5 * n_channels) laid out as the 5 term blocks above
+        self.terms = RingBuffer(window_size, 5 * n_channels)
+        self.sums = np.zeros((5, n_channels))
+        self.last = None              # last sample seen (for the pair terms)
+        self.last_sign = None         # last non-zero sign, 'sign' zero-crossing mode
+        self._since_resync = 0
+        self.spectrum = SlidingSpectrum(window_size, n_channels, fs) if 'MF' in self.features else None
+
+    def reset(self):
+        if self.spectrum is not None:
+            self.spectrum.reset()
+        self.terms.clear()
+        self.sums[:] = 0
+        self.last = None
+        self.last_sign = None
+        self._since_resync = 0
+
+    def _pair_terms(self, block):
+        """|x[i] - x[i-1]| and sign changes for every sample of the block (0 for the very first sample)."""
+        prev = block[0] if self.last is None else self.last
+        with_prev = np.vstack((prev[None], block))
+        diff = np.abs(np.diff(with_prev, axis=0))
+
+        if self.zc_mode == 'signbit':
+            signs = np.signbit(with_prev)
+        else:
+            signs = np.sign(with_prev)
+            seed = self.last_sign if self.last_sign is not None else np.where(signs[0] == 0, 1, signs[0])
+            signs[0] = seed
+            idx = np.where(signs != 0, np.arange(len(signs))[:, None], 0)
+            np.maximum.accumulate(idx, axis=0, out=idx)
+            signs = np.take_along_axis(signs, idx, axis=0)
+            self.last_sign = signs[-1].copy()
+        cross = (signs[1:] != signs[:-1]).astype(float)
+        if self.last is None:
+            cross[0] = 0.0
+        return diff, cross
+
+    def update(self, block):
+        """Push the next (n, n_channels) samples and return the features of the trailing window
+        (same layout as extract_features)."""
+        block = np.asarray(block, dtype=float)
+        if len(block) == 0:
+            return self.features_now()
+        if len(block) > self.window_size:
+            # Older samples cannot reach the window, only their last pair term would
+            self.last = block[-self.window_size - 1]
+            if self.zc_mode == 'sign':
+                self._pair_terms(block[:-self.window_size])
+            block = block[-self.window_size:]
+
+        if self.spectrum is not None:
+            self.spectrum.update(block)
+        diff, cross = self._pair_terms(block)
+        new_terms = np.hstack((block, block * block, np.abs(block), diff, cross))
+        self.last = block[-1].copy()
+
+        leaving = len(self.terms) + len(block) - self.window_size
+        if leaving > 0:
+            self.sums -= self.terms.window(self.terms.oldest, leaving).sum(axis=0).reshape(5, -1)
+        self.sums += new_terms.sum(axis=0).reshape(5, -1)
+        self.terms.write(new_terms)
+
+        self._since_resync += len(block)
+        if self._since_resync >= self.resync_every:
+            self.sums = self.terms.latest(len(self.terms)).sum(axis=0).reshape(5, -1)
+            self._since_resync = 0
+        return self.features_now()
+
+    def features_now(self):
+        n = len(self.terms)
+        out = np.zeros((self.n_channels, len(self.features)))
+        if n == 0:
+            return out.ravel()
+        s = self.sums
+        # Pair terms of the oldest sample link it to a sample outside the window
+        first = self.terms.window(self.terms.oldest, 1)[0].reshape(5, -1)
+        mean = s[X] / n
+        mean_sq = s[X2] / n
+        var = np.maximum(mean_sq - mean * mean, 0.0)
+
+        for k, name in enumerate(self.features):
+            if name == 'RMS':
+                out[:, k] = np.sqrt(mean_sq)
+            elif name in ('RMS_SD', 'STD'):
+                out[:, k] = np.sqrt(var)
+            elif name == 'VAR':
+                out[:, k] = var
+            elif name == 'ZC':
+                out[:, k] = np.round(s[CROSS] - first[CROSS])
+            elif name == 'WL':
+                out[:, k] = s[DIFF] - first[DIFF]
+            elif name == 'MAV':
+                out[:, k] = s[ABS] / n
+            elif name == 'IAV':
+                out[:, k] = s[ABS]
+            elif name == 'MF':
+                out[:, k] = self.spectrum.mean_frequency()
+            else:
+                raise ValueError(f"Unknown feature '{name}'")
+        return out.ravel()
@@ -0,0 +1,133 @@
+# -------------------------- Filter bank
+# Notch + bandpass designed once per (fs, band, notch) setting and applied to all
+# channels of a (n_samples, n_channels) block in one call.
+#
+#   process(chunk)     causal, keeps filter state between chunks so only new samples
+#                      are filtered (no window-edge transients)
+#   zero_phase(window) same output as the per-channel filtfilt used offline for the
+#                      training sets, for model parity
+#
+# KalmanSmoother is the scalar random-walk Kalman filter (what pykalman ran with
+# transition_matrices=[1], observation_matrices=[1], initial mean 0 and covariance 1).
+# The gain does not depend on the data: it starts at 0.99 and only settles at the
+# steady state (0.031 for Q = 1e-5, R = 0.01) after ~100-200 samples (0.168 at k=5,
+# 0.054 at k=20, 0.034 at k=50). The first samples after a start therefore run the
+# precomputed time-varying gains, in closed form with a cumulative product / sum; after
+# that the filter is the first-order recursion x[k] = x[k-1] + K * (y[k] - x[k-1]), one
+# lfilter call for all channels. Same output as pykalman's filter(), window or stream.
+
+import functools
+import numpy as np
+from scipy.signal import butter, iirnotch, filtfilt, lfilter, sosfilt, sosfilt_zi, tf2sos
+
+
+@functools.lru_cache(maxsize=None)
+def design_filters(fs, band=(5.0, 120.0), notch=50.0, order=4, quality=30):
+    """(b, a) stages in application order (notch, then bandpass) and the same chain as SOS."""
+    nyq = 0.5 * fs
+    stages = []
+    sos = []
+    if notch:
+        b, a = iirnotch(notch / nyq, quality)
+        stages.append((b, a))
+        sos.append(tf2sos(b, a))
+    if band:
+        low, high = band[0] / nyq, band[1] / nyq
+        stages.append(butter(order, [low, high], btype='band'))
+        sos.append(butter(order, [low, high], btype='band', output='sos'))
+    sos = np.vstack(sos) if sos else np.empty((0, 6))
+    return tuple(stages), sos
+
+
+class FilterBank:
+    def __init__(self, fs, n_channels, band=(5.0, 120.0), notch=50.0, order=4, quality=30):
+        self.fs = fs
+        self.n_channels = n_channels
+        band = tuple(band) if band else None
+        self.stages, self.sos = design_filters(fs, band, notch, order, quality)
+        self._zi_unit = sosfilt_zi(self.sos)[:, :, None] if len(self.sos) else None
+        self.zi = None
+
+    def reset(self):
+        self.zi = None
+
+    def process(self, chunk):
+        """Causal filtering of the next (n, n_channels) chunk, continuing from the last call."""
+        chunk = np.asarray(chunk, dtype=float)
+        if len(chunk) == 0 or self._zi_unit is None:
+            return chunk.copy()
+        if self.zi is None:
+            # Start in steady state for the first sample to avoid a start-up step response
+            self.zi = self._zi_unit * chunk[0]
+        out, self.zi = sosfilt(self.sos, chunk, axis=0, zi=self.zi)
+        return out
+
+    def zero_phase(self, window):
+        """Zero-phase filtering of a whole (n, n_channels) window, identical to filtfilt per channel.
+
+        Always returns a new array.
+        """
+        out = np.array(window, dtype=float)
+        for b, a in self.stages:
+            out = filtfilt(b, a, out, axis=0)
+        return out
+
+
+def steady_state_gain(transition_covariance=1e-5, observation_covariance=0.01):
+    """Kalman gain of the scalar random walk once the error covariance has converged."""
+    q, r = transition_covariance, observation_covariance
+    p = (q + np.sqrt(q * q + 4 * q * r)) / 2     # predicted covariance, root of P^2 - qP - qr = 0
+    return p / (p + r)
+
+
+@functools.lru_cache(maxsize=None)
+def transient_gains(transition_covariance=1e-5, observation_covariance=0.01, initial_covariance=1.0, rtol=1e-6):
+    """Kalman gains from the first sample until they are within `rtol` of the steady state."""
+    q, r = transition_covariance, observation_covariance
+    steady = steady_state_gain(q, r)
+    gains = []
+    p = initial_covariance                       # predicted covariance of the first sample
+    while True:
+        gain = p / (p + r)
+        if abs(gain - steady) <= rtol * steady:
+            break
+        gains.append(gain)
+        p = (1.0 - gain) * p + q
+    gains = np.array(gains)
+    gains.setflags(write=False)
+    return gains
+
+
+class KalmanSmoother:
+    def __init__(self, n_channels, transition_covariance=1e-5, observation_covariance=0.01):
+        self.n_channels = n_channels
+        self.gain = steady_state_gain(transition_covariance, observation_covariance)
+        self.gains = transient_gains(transition_covariance, observation_covariance)
+        self.b = np.array([self.gain])
+        self.a = np.array([1.0, self.gain - 1.0])
+        self.reset()
+
+    def reset(self):
+        self.state = np.zeros(self.n_channels)   # initial state mean 0, as in pykalman
+        self.step = 0                            # samples since the start, indexes self.gains
+
+    def process(self, chunk):
+        """Smooth the next (n, n_channels) chunk, continuing from the last call."""
+        chunk = np.asarray(chunk, dtype=float)
+        if len(chunk) == 0:
+            return chunk.copy()
+        out = np.empty_like(chunk)
+        n = 0
+        if self.step < len(self.gains):
+            # x[k] = (1 - K[k]) x[k-1] + K[k] y[k] = keep[k] (x[-1] + sum_j<=k K[j] y[j] / keep[j]),
+            # keep[k] = prod_j<=k (1 - K[j])
+            n = min(len(chunk), len(self.gains) - self.step)
+            gains = self.gains[self.step:self.step + n, None]
+            keep = np.cumprod(1.0 - gains, axis=0)
+            out[:n] = keep * (self.state + np.cumsum(gains * chunk[:n] / keep, axis=0))
+            self.step += n
+            self.state = out[n - 1]
+        if n < len(chunk):
+            out[n:], _ = lfilter(self.b, self.a, chunk[n:], axis=0, zi=(1.0 - self.gain) * self.state[None])
+            self.state = out[-1]
+        return out
@@ -0,0 +1,137 @@
+# -------------------------- Spectral features
+# Sliding DFT of the trailing window per channel, for the MF feature with overlapping
+# windows. When the window moves by h samples the spectrum is updated as
+#
+#   X'[k] = e^{+j2pi kh/N} * (X[k] + sum_m (x_in[m] - x_out[m]) e^{-j2pi km/N})
+#
+# which is one (channels, h) x (h, K) product with cached twiddles instead of an rFFT of
+# the whole window. That only pays off for small hops (cost ~ h*K vs ~ N*log2(N)), so in
+# 'auto' mode larger hops fall back to one rFFT of the stored window. The spectrum is
+# recomputed exactly every `resync_every` samples to stop rounding drift.
+#
+# The frequency grid and band masks are precomputed; mean frequency, median frequency
+# and band powers all read the same power spectrum.
+
+import functools
+import numpy as np
+from ring_buffer import RingBuffer
+
+
+@functools.lru_cache(maxsize=None)
+def frequency_grid(n_samples, fs):
+    freqs = np.fft.rfftfreq(n_samples, d=1/fs)
+    freqs.setflags(write=False)
+    return freqs
+
+
+@functools.lru_cache(maxsize=None)
+def band_masks(n_samples, fs, bands):
+    freqs = frequency_grid(n_samples, fs)
+    return np.array([(freqs >= low) & (freqs < high) for low, high in bands], dtype=float).T
+
+
+@functools.lru_cache(maxsize=32)
+def twiddles(n_samples, hop):
+    """(entering (hop, n_bins), rotation (n_bins,)) of the sliding DFT update."""
+    k = np.arange(n_samples // 2 + 1)
+    entering = np.exp(-2j * np.pi * np.outer(np.arange(hop), k) / n_samples)
+    rotation = np.exp(2j * np.pi * k * hop / n_samples)
+    entering.setflags(write=False)
+    rotation.setflags(write=False)
+    return entering, rotation
+
+
+def mean_frequency_from_power(power, freqs):
+    total = np.sum(power, axis=-1)
+    weighted = np.sum(freqs * power, axis=-1)
+    return np.divide(weighted, total, out=np.zeros_like(total), where=total != 0)
+
+
+def median_frequency_from_power(power, freqs):
+    cumulative = np.cumsum(power, axis=-1)
+    half = cumulative[..., -1:] / 2
+    idx = np.argmax(cumulative >= half, axis=-1)
+    return np.where(cumulative[..., -1] > 0, freqs[idx], 0.0)
+
+
+class SlidingSpectrum:
+    def __init__(self, window_size, n_channels, fs, method='auto', resync_every=None):
+        if method not in ('auto', 'sliding', 'fft'):
+            raise ValueError(f"Unknown method '{method}'")
+        self.window_size = window_size
+        self.n_channels = n_channels
+        self.fs = fs
+        self.method = method
+        self.resync_every = resync_every or window_size
+        self.freqs = frequency_grid(window_size, fs)
+        self.n_bins = len(self.freqs)
+        # Above this hop an rFFT of the window is cheaper than the sliding update
+        self.max_sliding_hop = max(1, int(2 * np.log2(window_size)))
+
+        self.samples = RingBuffer(window_size, n_channels)
+        self.spectrum = None          # (n_channels, n_bins) complex, None until recomputed
+        self._since_resync = 0
+        self._power = None
+
+    def reset(self):
+        self.samples.clear()
+        self.spectrum = None
+        self._power = None
+        self._since_resync = 0
+
+    def _use_sliding(self, hop):
+        if self.method == 'fft' or self.spectrum is None:
+            return False
+        if len(self.samples) < self.window_size or hop >= self.window_size:
+            return False
+        if self._since_resync + hop > self.resync_every:
+            return False
+        return self.method == 'sliding' or hop <= self.max_sliding_hop
+
+    def update(self, block):
+        """Push the next (n, n_channels) samples."""
+        block = np.asarray(block, dtype=float)
+        hop = len(block)
+        if hop == 0:
+            return
+        if self._use_sliding(hop):
+            leaving = self.samples.window(self.samples.oldest, hop)
+            entering, rotation = twiddles(self.window_size, hop)
+            self.spectrum = (self.spectrum + (block - leaving).T @ entering) * rotation
+            self._since_resync += hop
+        else:
+            self.spectrum = None      # recomputed from the stored window when asked for
+        self.samples.write(block)
+        self._power = None
+
+    def power(self):
+        """Power spectrum |X|^2 of the trailing window, (n_channels, n_bins)."""
+        if self._power is None:
+            if self.spectrum is None:
+                x = np.ascontiguousarray(self.samples.latest(len(self.samples)).T)
+                if x.shape[-1] < self.window_size:
+                    # Not full yet: spectrum of what we have, on its own grid
+                    return np.abs(np.fft.rfft(x, axis=-1)) ** 2
+                self.spectrum = np.fft.rfft(x, axis=-1)
+                self._since_resync = 0
+            self._power = np.abs(self.spectrum) ** 2
+        return self._power
+
+    def _grid(self, power):
+        if power.shape[-1] == self.n_bins:
+            return self.freqs
+        return frequency_grid(len(self.samples), self.fs)
+
+    def mean_frequency(self):
+        power = self.power()
+        return mean_frequency_from_power(power, self._grid(power))
+
+    def median_frequency(self):
+        power = self.power()
+        return median_frequency_from_power(power, self._grid(power))
+
+    def band_powers(self, bands):
+        """Summed power per (low, high) Hz band -> (n_channels, n_bands)."""
+        power = self.power()
+        n = self.window_size if power.shape[-1] == self.n_bins else len(self.samples)
+        return power @ band_masks(n, self.fs, tuple(map(tuple, bands)))
@@ -0,0 +1,174 @@
+# -------------------------- Fast forest inference
+# sklearn's forest predict validates the input and then walks every tree separately, which
+# for one window (one row) costs far more than the trees themselves. FastForest copies
+# the fitted trees into flat node tables once and walks all trees of the forest together:
+# one NumPy gather per tree level for the whole forest (and a whole batch of rows).
+#
+# The results are the same as sklearn's, bit for bit:
+#   - rows are cast to float32 before the split comparisons, as sklearn does
+#   - leaf probabilities are normalised per tree like DecisionTreeClassifier.predict_proba
+#   - trees are summed one after another in tree order (cumsum, not pairwise sum), then
+#     divided by the number of trees, like the forest's accumulation
+#
+# Supported: RandomForest / ExtraTrees classifiers and regressors (single output) and a
+# MultiOutputRegressor of those. Pipelines are handled by fast_model.py.
+#
+#   python fast_forest.py [model file]      benchmark against sklearn's predict
+
+import sys
+import time
+import warnings
+import joblib
+import numpy as np
+
+
+class FastForest:
+    def __init__(self, model):
+        if hasattr(model, 'estimators_') and hasattr(model.estimators_[0], 'estimators_'):
+            forests = list(model.estimators_)          # MultiOutputRegressor
+        else:
+            forests = [model]
+        for forest in forests:
+            if not hasattr(forest, 'estimators_') or not hasattr(forest.estimators_[0], 'tree_'):
+                raise TypeError(f"Not a fitted tree ensemble: {type(forest).__name__}")
+            if forest.n_outputs_ != 1:
+                raise TypeError("Multi-output forests are not supported (wrap them in MultiOutputRegressor)")
+
+        self.model = model
+        self.is_classifier = hasattr(forests[0], 'classes_')
+        if self.is_classifier and len(forests) > 1:
+            raise TypeError("Only single classifiers are supported")
+        self.classes_ = forests[0].classes_ if self.is_classifier else None
+        self.n_features_in_ = forests[0].n_features_in_
+        self.feature_names_in_ = getattr(model, 'feature_names_in_', None)
+
+        # Flatten every tree of every forest into one node table
+        children, feature, threshold, values, roots = [], [], [], [], []
+        self._groups = []                               # tree range of each forest
+        offset = 0
+        max_depth = 0
+        for forest in forests:
+            first = len(roots)
+            for est in forest.estimators_:
+                tree = est.tree_
+                n = tree.node_count
+                left = tree.children_left.astype(np.intp)
+                right = tree.children_right.astype(np.intp)
+                leaf = left == -1
+                # Leaves point at themselves, so extra levels leave them where they are
+                own = np.arange(n)
+                left = np.where(leaf, own, left) + offset
+                right = np.where(leaf, own, right) + offset
+                children.append(np.column_stack((left, right)).ravel())
+                feature.append(np.where(leaf, 0, tree.feature).astype(np.intp))
+                threshold.append(tree.threshold)
+                if self.is_classifier:
+                    # Same normalisation as DecisionTreeClassifier.predict_proba
+                    value = tree.value[:, 0, :est.n_classes_]
+                    normalizer = value.sum(axis=1)[:, None]
+                    normalizer[normalizer == 0.0] = 1.0
+                    values.append(value / normalizer)
+                else:
+                    values.append(tree.value[:, 0, :1])
+                roots.append(offset)
+                offset += n
+                max_depth = max(max_depth, tree.max_depth)
+            self._groups.append((first, len(roots)))
+
+        self._children = np.concatenate(children)       # [2 * node] left, [2 * node + 1] right
+        self._feature = np.concatenate(feature)
+        self._threshold = np.concatenate(threshold)
+        self._values = np.concatenate(values)
+        self._roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = max_depth
+        self.n_trees = len(roots)
+        self.n_nodes = offset
+
+    @property
+    def nbytes(self):
+        """Memory held by the node tables."""
+        return sum(a.nbytes for a in (self._children, self._feature, self._threshold,
+                                      self._values, self._roots))
+
+    @classmethod
+    def load(cls, path):
+        return cls(joblib.load(path))
+
+    def _check(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X[None]
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected rows of {self.n_features_in_} features, got shape {X.shape}")
+        # sklearn compares float32 features against the float64 thresholds
+        return X.astype(np.float32)
+
+    def apply(self, X):
+        """Leaf (row in the flat node table) reached in every tree, (n_rows, n_trees)."""
+        X = self._check(X)
+        node = np.broadcast_to(self._roots, (len(X), self.n_trees))
+        rows = np.arange(len(X))[:, None]
+        for _ in range(self.max_depth):
+            go_right = X[rows, self._feature[node]] > self._threshold[node]
+            node = self._children[2 * node + go_right]
+        return node
+
+    def _tree_mean(self, leaves):
+        """Per forest: sum of the tree outputs in tree order / number of trees."""
+        out = []
+        for first, last in self._groups:
+            per_tree = self._values[leaves[:, first:last]]           # (rows, trees, k)
+            total = np.cumsum(per_tree, axis=1)[:, -1]
+            out.append(total / (last - first))
+        return out
+
+    def predict_proba(self, X):
+        if not self.is_classifier:
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._tree_mean(self.apply(X))[0]
+
+    def predict(self, X):
+        means = self._tree_mean(self.apply(X))
+        if self.is_classifier:
+            return self.classes_.take(np.argmax(means[0], axis=1), axis=0)
+        if len(means) == 1:
+            return means[0][:, 0]
+        return np.column_stack([m[:, 0] for m in means])
+
+
+# ---------------- Benchmark -----------------
+def _time_call(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def benchmark(path, n_rows=(1, 32), repeat=50, seed=0):
+    model = joblib.load(path)
+    estimator = model.steps[-1][1] if hasattr(model, 'steps') else model
+    fast = FastForest(estimator)
+    print(f"{path}: {type(estimator).__name__}, {fast.n_trees} trees, {fast.n_nodes} nodes, depth {fast.max_depth}")
+
+    # Fitted on a DataFrame, benchmarked on arrays as CompiledModel calls it
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    rng = np.random.default_rng(seed)
+    for n in n_rows:
+        X = rng.standard_normal((n, fast.n_features_in_))
+        if fast.is_classifier:
+            same = (np.array_equal(fast.predict_proba(X), estimator.predict_proba(X))
+                    and np.array_equal(fast.predict(X), estimator.predict(X)))
+        else:
+            same = np.array_equal(fast.predict(X), estimator.predict(X))
+        t_sklearn = _time_call(lambda: estimator.predict(X), repeat)
+        t_fast = _time_call(lambda: fast.predict(X), repeat)
+        print(f"  {n:3d} rows: sklearn {t_sklearn * 1e3:8.3f} ms | fast {t_fast * 1e3:8.3f} ms | "
+              f"x{t_sklearn / t_fast:5.1f} | identical: {same}")
+
+
+if __name__ == '__main__':
+    paths = sys.argv[1:] or ["../notebooks/models/4_classes_cont_01_07.pkl",
+                             "../notebooks/models/regressor_01_07.joblib"]
+    for p in paths:
+        benchmark(p)
@@ -0,0 +1,125 @@
+# -------------------------- Compiled model wrapper
+# Feature row (NumPy) -> StandardScaler -> model, without any pandas object on the way.
+#
+# The scaler's mean_ / scale_ and the column order the artifacts were fitted with
+# (feature_names_in_) are read once. A Pipeline is unwrapped into its StandardScaler
+# steps and the final estimator. Forests run on FastForest; any other estimator is
+# called directly on the array.
+#
+# The affine step is (x - mean) / scale into a preallocated buffer, the same operations
+# StandardScaler.transform does, so the scaled values (and predictions) are identical.
+# Multiplying by a precomputed 1/scale would save a few ns but can move a value by one
+# ulp across a split threshold.
+#
+# Column order is checked when the wrapper is built: if the features the script
+# computes are not the ones the model was fitted on, it fails immediately instead of
+# predicting on shuffled columns.
+
+import warnings
+import joblib
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+from fast_forest import FastForest
+
+
+def _unwrap(model):
+    """(list of StandardScalers, final estimator) for a Pipeline or a bare estimator."""
+    if not hasattr(model, 'steps'):
+        return [], model
+    scalers = []
+    for name, step in model.steps[:-1]:
+        if step is None or step == 'passthrough':
+            continue
+        if not isinstance(step, StandardScaler):
+            raise TypeError(f"Pipeline step '{name}' ({type(step).__name__}) is not supported, "
+                            "only StandardScaler before the model")
+        scalers.append(step)
+    return scalers, model.steps[-1][1]
+
+
+class CompiledModel:
+    def __init__(self, model, scaler=None, columns=None):
+        scalers, estimator = _unwrap(model)
+        if scaler is not None:
+            scalers.insert(0, scaler)
+        self.estimator = estimator
+
+        # Fitted column order: first artifact that recorded one
+        names = None
+        for artifact in scalers + [model, estimator]:
+            fitted = getattr(artifact, 'feature_names_in_', None)
+            if fitted is None:
+                continue
+            if names is None:
+                names = list(fitted)
+            elif list(fitted) != names:
+                raise ValueError(f"{type(artifact).__name__} was fitted on different columns than the scaler")
+        self.feature_names = names
+        if columns is not None:
+            self.check_columns(columns)
+
+        self.n_features = getattr(estimator, 'n_features_in_', None) or len(names or [])
+        self._steps = []
+        for s in scalers:
+            mean = s.mean_ if s.with_mean else None
+            scale = s.scale_ if s.with_std else None
+            if mean is not None or scale is not None:
+                self._steps.append((mean, scale))
+
+        try:
+            self.engine = FastForest(estimator)
+        except (TypeError, AttributeError):
+            self.engine = None                          # not a forest: sklearn on the array
+        self.classes_ = getattr(estimator, 'classes_', None)
+        self._buf = np.empty((1, self.n_features))
+
+    @classmethod
+    def load(cls, model_path, scaler_path=None, columns=None):
+        scaler = joblib.load(scaler_path) if scaler_path else None
+        return cls(joblib.load(model_path), scaler, columns)
+
+    def check_columns(self, columns):
+        """Raise if `columns` is not exactly the fitted column order."""
+        if self.feature_names is not None and list(columns) != self.feature_names:
+            missing = [c for c in self.feature_names if c not in columns]
+            extra = [c for c in columns if c not in self.feature_names]
+            if missing or extra:
+                raise ValueError(f"Feature layout does not match the model: missing {missing}, unexpected {extra}")
+            raise ValueError("Feature layout does not match the model: same columns, different order")
+
+    def transform(self, X):
+        """Scaled rows as float64, shape (n_rows, n_features). Reuses an internal buffer."""
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X[None]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+        if not self._steps:
+            return X
+        if self._buf.shape != X.shape:
+            self._buf = np.empty(X.shape)
+        out = self._buf
+        src = X
+        for mean, scale in self._steps:
+            if mean is not None:
+                np.subtract(src, mean, out=out)
+                src = out
+            if scale is not None:
+                np.divide(src, scale, out=out)
+                src = out
+        return out
+
+    def _call(self, method, X):
+        Xs = self.transform(X)
+        if self.engine is not None:
+            return getattr(self.engine, method)(Xs)
+        with warnings.catch_warnings():
+            # Fitted on a DataFrame; the columns were checked above
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            return getattr(self.estimator, method)(Xs)
+
+    def predict(self, X):
+        return self._call('predict', X)
+
+    def predict_proba(self, X):
+        return self._call('predict_proba', X)
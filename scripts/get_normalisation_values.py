@@ -1,28 +1,17 @@
 # --------------------- Collect Max Absolute EMG Value Per Channel ---------------------
 
-import socket
-import json
 import numpy as np
-from scipy.signal import butter, filtfilt, iirnotch
-import keyboard
 import time
 import csv
 from pathlib import Path
+from openbci_udp import OpenBCIReceiver
+from control import ControlChannel, window_samples
+from emg_filters import FilterBank
 
 # --------------------- Filter functions
 
-def bandpass_filter(data, lowcut=5.0, highcut=50.0, fs=250.0, order=4):
-    nyq = 0.5 * fs
-    low = lowcut / nyq
-    high = highcut / nyq
-    b, a = butter(order, [low, high], btype='band')
-    return filtfilt(b, a, data)
-
-def notch_filter(signal, freq=50.0, fs=250, quality=30):
-    nyquist = 0.5 * fs
-    norm_freq = freq / nyquist
-    b, a = iirnotch(norm_freq, quality)
-    return filtfilt(b, a, signal)
+# Notch (50 Hz) + bandpass (5-50 Hz), designed once and applied to all channels together
+filter_bank = FilterBank(fs=250, n_channels=3, band=(5.0, 50.0), notch=50.0)
 
 def tkeo(signal):  # Teager-Kaiser Energy Operator 
     output = np.zeros_like(signal)
@@ -35,77 +24,72 @@ def tkeo(signal):  # Teager-Kaiser Energy Operator
 UDP_IP = "127.0.0.1"
 UDP_PORT = 12345
 WINDOW_SIZE = 125  # 0.5 seconds at 250 Hz
+HOP_SIZE = 50  # new samples between consecutive (overlapping) windows
+
+# Non-blocking receiver, drains all pending packets (JSON or binary) into its ring
+receiver = OpenBCIReceiver(UDP_IP, UDP_PORT, n_channels=3, capacity=4 * WINDOW_SIZE)
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind((UDP_IP, UDP_PORT))
+# Stop / pause / resume / model / window commands: signals or `python control.py <command>`
+control = ControlChannel().start()
 
-print("Collecting max absolute values... Press ESC to stop and save.")
+print("Collecting max absolute values... Ctrl+C or `python control.py stop` to stop and save.")
 
-# Buffers and max trackers
-buffer_ch1 = []
-buffer_ch2 = []
-buffer_ch3 = []
+# Ring buffer for the 3 channels, filled by the receiver; windows are cut from it without list copies
+ring = receiver.ring
+next_window_at = WINDOW_SIZE  # sample count at which the next window is due
 
 max_abs = [0.0, 0.0, 0.0]  # Will store max absolute value per channel
 
 try:
-    while True:
-        if keyboard.is_pressed('esc'):
-            print("ESC pressed. Saving max values and exiting...")
-            break
-
-        data, addr = sock.recvfrom(4096)
+    while not control.stopped:
+        # Every pending packet goes straight into the ring
+        if not receiver.poll(timeout=0.05):
+            continue
+        if control.paused:
+            # Start over with a fresh window after resume
+            next_window_at = ring.total + WINDOW_SIZE
+            continue
         try:
-            packet = json.loads(data.decode())
-
-            if 'data' in packet:
-                channel_data = packet['data']
-
-                ch1 = channel_data[0]
-                ch2 = channel_data[1]
-                ch3 = channel_data[2]
-
-                buffer_ch1.extend(ch1)
-                buffer_ch2.extend(ch2)
-                buffer_ch3.extend(ch3)
-
-                if len(buffer_ch1) >= WINDOW_SIZE:
-                    arr1 = np.array(buffer_ch1)
-                    arr2 = np.array(buffer_ch2)
-                    arr3 = np.array(buffer_ch3)
-
-                    # Filter
-                    arr1 = notch_filter(arr1)
-                    arr2 = notch_filter(arr2)
-                    arr3 = notch_filter(arr3)
-
-                    arr1 = bandpass_filter(arr1)
-                    arr2 = bandpass_filter(arr2)
-                    arr3 = bandpass_filter(arr3)
-
-                    arr1 = tkeo(arr1)
-                    arr2 = tkeo(arr2)
-                    arr3 = tkeo(arr3)
-
-                    # Update max absolute values
-                    max_abs[0] = max(max_abs[0], np.max(np.abs(arr1)))
-                    max_abs[1] = max(max_abs[1], np.max(np.abs(arr2)))
-                    max_abs[2] = max(max_abs[2], np.max(np.abs(arr3)))
-
-                    # Keep only the most recent samples for overlap
-                    shift = WINDOW_SIZE - 50
-                    buffer_ch1 = buffer_ch1[-shift:]
-                    buffer_ch2 = buffer_ch2[-shift:]
-                    buffer_ch3 = buffer_ch3[-shift:]
+            if ring.total >= next_window_at:
+                # Reconfiguration from the control channel, between windows
+                for cmd, arg in control.commands():
+                    if cmd == 'window':
+                        WINDOW_SIZE, HOP_SIZE = window_samples(arg, 250, HOP_SIZE, ring.capacity)
+                        print(f"[INFO] Window {WINDOW_SIZE} samples, hop {HOP_SIZE} samples")
+                    elif cmd == 'model':
+                        print("[WARN] No model to swap in this script.")
+                if len(ring) < WINDOW_SIZE:
+                    next_window_at = ring.oldest + WINDOW_SIZE
+                    continue
+
+                # Latest window, (n_samples, n_channels)
+                window = ring.latest(WINDOW_SIZE)
+
+                # Notch + bandpass filter, all channels in one call
+                arr1, arr2, arr3 = filter_bank.zero_phase(window).T
+
+                arr1 = tkeo(arr1)
+                arr2 = tkeo(arr2)
+                arr3 = tkeo(arr3)
+
+                # Update max absolute values
+                max_abs[0] = max(max_abs[0], np.max(np.abs(arr1)))
+                max_abs[1] = max(max_abs[1], np.max(np.abs(arr2)))
+                max_abs[2] = max(max_abs[2], np.max(np.abs(arr3)))
+
+                # Next window after HOP_SIZE new samples (overlap = WINDOW_SIZE - HOP_SIZE)
+                next_window_at = ring.total + HOP_SIZE
 
         except Exception as e:
-            print("Error decoding JSON:", e)
+            print("Error processing window:", e)
 
 except KeyboardInterrupt:
     print("Interrupted by user.")
 
 finally:
-    sock.close()
+    control.close()
+    receiver.close()
+    print("Saving max values and exiting...")
     # Save to CSV
     save_path = Path("max_abs_values.csv")
     with open(save_path, mode='w', newline='') as file:
@@ -0,0 +1,121 @@
+# -------------------------- Latency tracking
+# How stale is a prediction when it leaves for Unity? Every prediction carries a list of
+# time.perf_counter() stamps, one per pipeline point, in the order given by `stages`:
+#
+#   arrival   the newest sample of the window arrived (device poll / UDP datagram)
+#   window    the window was cut
+#   ...       filter, features, each predict ... (per script)
+#   output    after the UDP send
+#
+# record() adds every segment (stamp - previous stamp, named after the later point) and
+# the total (last - first) to log-spaced histograms: 40 bins per decade from 1 us to
+# 10 s, so p50 / p95 / p99 are within ~6%. Recording is a few list operations per
+# prediction, nothing is allocated per sample.
+#
+# Every `interval` s the stats of the last interval and since start are written to a
+# text file (replaced atomically, so it can be watched with `type` / `cat` / tail -f
+# alike), and printed at the end. With interval None there are no intervals: the stats
+# since start are printed and written once, at the end. A stamps list that does not
+# match `stages` is left out with a warning (once) rather than skewing the histograms.
+
+import bisect
+import math
+import os
+import time
+
+EDGES = [10 ** (e / 40) for e in range(-240, 41)]      # 1 us .. 10 s, upper bin edges
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(EDGES) + 1)          # last bin: above 10 s
+        self.n = 0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(EDGES, seconds)] += 1
+        self.n += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Upper edge of the bin holding the q-th percentile (seconds), NaN if empty."""
+        if not self.n:
+            return math.nan
+        rank = q / 100 * self.n
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(EDGES[i], self.max) if i < len(EDGES) else self.max
+        return self.max
+
+
+class LatencyTracker:
+    def __init__(self, stages, path=None, interval=10.0):
+        self.stages = tuple(stages)
+        self.names = self.stages[1:] + ('total',)
+        self.path = path
+        self.interval = interval
+        self.started = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.total = {name: Histogram() for name in self.names}
+        self.recent = {name: Histogram() for name in self.names}
+        self._next_flush = time.perf_counter() + interval if interval else None
+        self._mismatched = 0                          # record() calls with the wrong number of stamps
+
+    def record(self, stamps):
+        """Add one prediction's stamps (one per stage, in stage order)."""
+        if len(stamps) != len(self.stages):
+            self._mismatched += 1
+            if self._mismatched == 1:
+                print(f"[WARN] Latency: {len(stamps)} stamps for {len(self.stages)} stages {self.stages}, "
+                      f"predictions like this are left out (further ones only counted)")
+            return
+        for i in range(1, len(stamps)):
+            segment = stamps[i] - stamps[i - 1]
+            name = self.stages[i]
+            self.total[name].add(segment)
+            self.recent[name].add(segment)
+        self.total['total'].add(stamps[-1] - stamps[0])
+        self.recent['total'].add(stamps[-1] - stamps[0])
+        if self._next_flush is not None and stamps[-1] >= self._next_flush:
+            self._next_flush = stamps[-1] + self.interval
+            self.flush()
+
+    def table(self, hists):
+        lines = [f"{'stage':<12}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for name in self.names:
+            h = hists[name]
+            lines.append(f"{name:<12}{h.n:>8}{h.percentile(50) * 1e3:>10.2f}{h.percentile(95) * 1e3:>10.2f}"
+                         f"{h.percentile(99) * 1e3:>10.2f}{h.max * 1e3:>10.2f}")
+        return "\n".join(lines)
+
+    def report(self):
+        since = f"# since {self.started}\n{self.table(self.total)}\n"
+        if not self.interval:                         # no intervals, the file is written at the end only
+            return since
+        return (f"# last {self.interval:g} s ({time.strftime('%Y-%m-%d %H:%M:%S')})\n{self.table(self.recent)}\n\n"
+                + since)
+
+    def flush(self):
+        """Write the report (if there is a file) and start a new interval."""
+        if self.path:
+            tmp = self.path + '.tmp'
+            try:
+                with open(tmp, 'w') as f:
+                    f.write(self.report())
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"[WARN] Could not write {self.path}: {e}")
+        self.recent = {name: Histogram() for name in self.names}
+
+    def close(self):
+        # Called first in the scripts' shutdown: never let a report error skip the rest of it
+        try:
+            print(f"[INFO] Latency since {self.started}\n{self.table(self.total)}")
+            if self._mismatched:
+                print(f"[WARN] Latency: {self._mismatched} predictions left out, wrong number of stamps")
+            if self.path:
+                self.flush()
+        except Exception as e:
+            print(f"[WARN] Latency report failed: {e}")
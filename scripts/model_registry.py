@@ -0,0 +1,160 @@
+# -------------------------- Model registry
+# Indexes the artifacts in notebooks/models by (user, task, variant) from their file
+# names and loads them only when asked for:
+#
+#   Position_clf_user_N.pkl / Position_clf_scaler_user_N.pkl   user N, position, 'default'
+#   Pressure_regressor_user_N.joblib                            user N, pressure, 'default'
+#   4_classes_cont_DD_MM[_V].pkl / 4_classes_scaler_cont_...    user 'all', position, 'DD_MM[_V]'
+#   regressor_DD_MM[_V].joblib                                  user 'all', pressure, 'DD_MM[_V]'
+#   6_classes_rf_cont_DD_MM.pkl / 6_classes_scaler_rf_cont_...  user 'all', position_6, 'DD_MM[...]'
+#
+# A bundle is the compiled position + pressure models of one (user, variant); its size is
+# the files plus the FastForest tables built from them (compiling copies every tree
+# into those tables). Loaded bundles sit in an LRU cache bounded by `budget_mb`; the
+# least recently used bundles are dropped first (the newest one always stays).
+#
+# request() loads in a background thread and returns a Future, so a running classifier
+# can pick the new bundle up once it is ready without its inference loop waiting.
+
+import collections
+import concurrent.futures
+import os
+import re
+import threading
+import joblib
+from fast_model import CompiledModel
+
+MODELS_DIR = "../notebooks/models"
+
+# (regex, task, kind); user and variant come from the named groups
+PATTERNS = [
+    (r'Position_clf_scaler_user_(?P<user>\d+)\.pkl', 'position', 'scaler'),
+    (r'Position_clf_user_(?P<user>\d+)\.pkl', 'position', 'model'),
+    (r'Pressure_regressor_user_(?P<user>\d+)\.joblib', 'pressure', 'model'),
+    (r'4_classes_scaler_cont_(?P<variant>\d\d_\d\d(?:_\w+)?)\.pkl', 'position', 'scaler'),
+    (r'4_classes_cont_(?P<variant>\d\d_\d\d(?:_\w+)?)\.pkl', 'position', 'model'),
+    (r'regressor_(?P<variant>\d\d_\d\d(?:_\w+)?)\.joblib', 'pressure', 'model'),
+    (r'6_classes_scaler_rf_cont_(?P<variant>\d\d_\d\d(?:_\w+)?)\.pkl', 'position_6', 'scaler'),
+    (r'6_classes_rf_cont_(?P<variant>\d\d_\d\d(?:_\w+)?)\.pkl', 'position_6', 'model'),
+]
+PATTERNS = [(re.compile(p), task, kind) for p, task, kind in PATTERNS]
+
+SHARED_USER = 'all'
+DEFAULT_VARIANT = 'default'
+
+
+def scan(models_dir=MODELS_DIR):
+    """{(user, task, variant): {'model': path, 'scaler': path}} for the files in models_dir."""
+    index = collections.defaultdict(dict)
+    for name in sorted(os.listdir(models_dir)):
+        for pattern, task, kind in PATTERNS:
+            m = pattern.fullmatch(name)
+            if m:
+                groups = m.groupdict()
+                key = (groups.get('user') or SHARED_USER, task, groups.get('variant') or DEFAULT_VARIANT)
+                index[key][kind] = os.path.join(models_dir, name)
+                break
+    return dict(index)
+
+
+class ModelBundle:
+    """Compiled models of one (user, variant), one CompiledModel per task."""
+
+    def __init__(self, user, variant, models, nbytes):
+        self.user = user
+        self.variant = variant
+        self.models = models
+        self.nbytes = nbytes
+
+    def __getitem__(self, task):
+        return self.models[task]
+
+    def get(self, task, default=None):
+        return self.models.get(task, default)
+
+    def __repr__(self):
+        return f"ModelBundle(user={self.user!r}, variant={self.variant!r}, tasks={sorted(self.models)})"
+
+
+class ModelRegistry:
+    def __init__(self, models_dir=MODELS_DIR, budget_mb=256, columns=None, use_scaler=True):
+        self.models_dir = models_dir
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.columns = columns
+        self.use_scaler = use_scaler
+        self.index = scan(models_dir)
+        self._cache = collections.OrderedDict()         # (user, variant, tasks) -> ModelBundle
+        self._lock = threading.Lock()
+        self._loader = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-loader')
+
+    # ---------------- Index -----------------
+    def users(self):
+        return sorted({user for user, _, _ in self.index}, key=lambda u: (not u.isdigit(), u.zfill(8)))
+
+    def variants(self, user):
+        return sorted({variant for u, _, variant in self.index if u == user})
+
+    def tasks(self, user, variant):
+        return sorted(task for u, task, v in self.index if u == user and v == variant and 'model' in self.index[u, task, v])
+
+    # ---------------- Loading -----------------
+    def load(self, path):
+        return joblib.load(path)
+
+    def _build(self, user, variant, tasks):
+        models = {}
+        nbytes = 0
+        for task in tasks:
+            entry = self.index.get((user, task, variant))
+            if entry is None or 'model' not in entry:
+                raise KeyError(f"No {task} model for user {user!r}, variant {variant!r}")
+            scaler = self.load(entry['scaler']) if self.use_scaler and 'scaler' in entry else None
+            model = CompiledModel(self.load(entry['model']), scaler, columns=self.columns)
+            models[task] = model
+            nbytes += sum(os.path.getsize(p) for p in entry.values())
+            if model.engine is not None:
+                nbytes += model.engine.nbytes
+        return ModelBundle(user, variant, models, nbytes)
+
+    def get(self, user, variant=DEFAULT_VARIANT, tasks=('position', 'pressure')):
+        """Bundle for (user, variant), from the cache or loaded now (blocking)."""
+        user = str(user)
+        key = (user, variant, tuple(tasks))
+        with self._lock:
+            bundle = self._cache.get(key)
+            if bundle is not None:
+                self._cache.move_to_end(key)
+                return bundle
+        bundle = self._build(user, variant, tasks)
+        with self._lock:
+            self._cache[key] = bundle
+            self._cache.move_to_end(key)
+            self._evict()
+        return bundle
+
+    def request(self, user, variant=DEFAULT_VARIANT, tasks=('position', 'pressure')):
+        """Load in the background; returns a Future resolving to the bundle."""
+        return self._loader.submit(self.get, user, variant, tasks)
+
+    def submit(self, fn, *args):
+        """Run any other load on the same background loader."""
+        return self._loader.submit(fn, *args)
+
+    def _evict(self):
+        while len(self._cache) > 1 and self.cached_bytes > self.budget:
+            key, bundle = self._cache.popitem(last=False)
+            print(f"[INFO] Model cache: dropped {bundle} ({bundle.nbytes / 1e6:.1f} MB)")
+
+    @property
+    def cached_bytes(self):
+        return sum(b.nbytes for b in self._cache.values())
+
+    def close(self):
+        self._loader.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == '__main__':
+    registry = ModelRegistry()
+    for user in registry.users():
+        for variant in registry.variants(user):
+            print(f"user {user:>4}  variant {variant:<10} tasks {registry.tasks(user, variant)}")
@@ -0,0 +1,189 @@
+# -------------------------- Noraxon streaming client
+# Keeps one keep-alive connection to the Noraxon MR3 HTTP stream and polls /samples
+# from its own thread. Every GET drains the device buffer, so the poll interval is
+# adapted to the observed fill rate: we ask again roughly when `target_chunk` new
+# samples should be waiting instead of sleeping a fixed 0.1 s / 0.5 s.
+# Samples land in a RingBuffer; consumers block on wait_for() / read() until enough
+# samples exist, or keep their own absolute cursor and use wait_until() + ring.window().
+
+import collections
+import threading
+import time
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from ring_buffer import RingBuffer
+
+NORAXON_URL = 'http://127.0.0.1:9220/samples'
+
+
+class NoraxonClient:
+    """Background reader for the Noraxon /samples endpoint.
+
+    Samples are handed out as float arrays shaped (n_samples, n_channels).
+    """
+
+    def __init__(self, url=NORAXON_URL, n_channels=3, sampling_rate=1500,
+                 target_chunk=75, min_interval=0.002, max_interval=0.1,
+                 buffer_seconds=60, timeout=1.0):
+        self.url = url
+        self.n_channels = n_channels
+        self.sampling_rate = sampling_rate
+        self.target_chunk = target_chunk          # samples we want per GET (75 = 50 ms at 1500 Hz)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+
+        # One pooled keep-alive connection, reused for every request
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
+        # Bounded memory: if nobody consumes, the oldest samples are overwritten
+        self.ring = RingBuffer(int(buffer_seconds * sampling_rate), n_channels)
+        self.read_pos = 0                         # absolute index of the next sample read() returns
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.rate = float(sampling_rate)          # observed fill rate (samples/s)
+        self._arrivals = collections.deque(maxlen=256)   # (total after the chunk, perf_counter)
+        self.interval = target_chunk / sampling_rate
+
+    # ---------------- Lifecycle -----------------
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2 * self.max_interval + self.timeout)
+        with self._cond:
+            self._cond.notify_all()
+        self.session.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------------- Acquisition -----------------
+    def fetch(self):
+        """Single GET on the pooled session. Returns (n, n_channels) array, or None if nothing usable."""
+        response = self.session.get(self.url, timeout=self.timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"Unable to fetch data. Status code: {response.status_code}")
+        channels_data = response.json().get('channels', [])
+        if len(channels_data) < self.n_channels:
+            return None
+        columns = [channels_data[c]['samples'] for c in range(self.n_channels)]
+        n = min(len(col) for col in columns)
+        if n == 0:
+            return None
+        samples = np.empty((n, self.n_channels))
+        for c, col in enumerate(columns):
+            samples[:, c] = col[:n]
+        return samples
+
+    def _run(self):
+        last_poll = None                          # start of the previous successful poll
+        failing = False
+        while not self._stop.is_set():
+            poll_start = time.monotonic()
+            try:
+                samples = self.fetch()
+                arrived = time.perf_counter()
+                if failing:
+                    print("[INFO] Noraxon stream back.")
+                failing = False
+            except Exception as e:
+                if not failing:
+                    print(f"Error fetching Noraxon samples: {e}")
+                failing = True
+                samples = None
+                last_poll = None
+
+            if samples is not None:
+                self._push(samples, arrived)
+                # Track the real fill rate (smoothed), then aim the next poll at target_chunk
+                if last_poll is not None and poll_start > last_poll:
+                    self.rate = 0.8 * self.rate + 0.2 * (len(samples) / (poll_start - last_poll))
+                self.interval = self.target_chunk / max(self.rate, 1.0)
+            else:
+                # Nothing streaming (or error): back off towards max_interval
+                self.interval = min(self.max_interval, self.interval * 2)
+            if not failing:
+                last_poll = poll_start
+
+            spent = time.monotonic() - poll_start
+            delay = min(self.max_interval, max(self.min_interval, self.interval - spent))
+            self._stop.wait(delay)
+
+    def _push(self, samples, arrived=None):
+        with self._cond:
+            self.ring.write(samples)
+            self._arrivals.append((self.ring.total, arrived if arrived is not None else time.perf_counter()))
+            self._cond.notify_all()
+
+    # ---------------- Consumers -----------------
+    @property
+    def total(self):
+        """Samples received since start."""
+        return self.ring.total
+
+    @property
+    def available(self):
+        return self.ring.total - max(self.read_pos, self.ring.oldest)
+
+    def arrival_time(self, index):
+        """time.perf_counter() when sample `index` (absolute) was received, None if too old."""
+        with self._cond:
+            found = None
+            for total, arrived in reversed(self._arrivals):
+                if total <= index:
+                    break
+                found = arrived
+            return found
+
+    def wait_until(self, index, timeout=None):
+        """Block until sample `index` (absolute) has arrived, i.e. total >= index."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.ring.total >= index or self._stop.is_set(),
+                                       timeout=timeout) and self.ring.total >= index
+
+    def wait_for(self, n, timeout=None):
+        """Block until at least n unread samples exist. Returns False on timeout/stop."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.available >= n or self._stop.is_set(),
+                                       timeout=timeout) and self.available >= n
+
+    def read(self, n, timeout=None):
+        """Consume the next n samples, blocking until they exist. None on timeout.
+
+        Returns a view into the ring when possible; copy it before modifying in place.
+        """
+        if not self.wait_for(n, timeout):
+            return None
+        with self._cond:
+            if self.read_pos < self.ring.oldest:
+                print(f"[WARN] Consumer fell behind, skipped {self.ring.oldest - self.read_pos} samples.")
+                self.read_pos = self.ring.oldest
+            out = self.ring.window(self.read_pos, n)
+            self.read_pos += n
+            return out
+
+    def drain(self):
+        """Consume everything received so far as a new array; (0, n_channels) if nothing is pending."""
+        with self._cond:
+            start = max(self.read_pos, self.ring.oldest)
+            out = np.array(self.ring.window(start, self.ring.total - start))
+            self.read_pos = self.ring.total
+            return out
+
+    def clear(self):
+        with self._cond:
+            self.read_pos = self.ring.total
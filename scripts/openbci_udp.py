@@ -0,0 +1,193 @@
+# -------------------------- OpenBCI UDP ingestion
+# Receives the OpenBCI GUI time-series stream ({"data": [[ch1...], [ch2...], ...]}, one
+# datagram per ~8 samples) straight into a RingBuffer. The socket is non-blocking and
+# every poll() drains all pending datagrams with recv_into on one reused buffer.
+#
+# Two payloads are accepted:
+#   JSON    parsed with json.loads and written to the ring as one block (a hand-rolled
+#           np.fromstring scan of the "data" array measured no faster for ~8 samples)
+#   binary  16-byte header + float32 samples, see pack_samples(); sent by this module
+#           when run as a script (replays an OpenBCI recording)
+#
+# Binary packets carry a sequence number and a sender id (random per sender, like the
+# session of unity_protocol.py): gaps in the sequence count as lost packets, a new sender
+# id starts the count over, and a jump of more than MAX_GAP either way (a sender that
+# restarted with the same id) is taken as a resync rather than billions of lost packets.
+# A packet up to MAX_GAP behind arrived late (reordered) and is no longer counted lost.
+#
+#   python openbci_udp.py <recording.csv> [binary|json] [speed]
+
+import json
+import random
+import select
+import socket
+import struct
+import sys
+import time
+import numpy as np
+from ring_buffer import RingBuffer
+
+UDP_IP = "127.0.0.1"
+UDP_PORT = 12345
+
+# magic, version, n_channels, n_samples, sequence number, sender id, 2 pad bytes (keeps the
+# samples 4-byte aligned); then (n_samples, n_channels) float32
+HEADER = struct.Struct('<4sBBHIH2x')
+MAGIC = b'EMG1'
+VERSION = 2
+MAX_GAP = 1024     # packets (~30 s at 250 Hz / 8 samples); a larger jump is a resync, not loss
+
+
+def pack_samples(samples, seq=0, sender=0):
+    """Binary packet for a (n_samples, n_channels) block."""
+    samples = np.ascontiguousarray(samples, dtype='<f4')
+    n, c = samples.shape
+    return HEADER.pack(MAGIC, VERSION, c, n, seq & 0xFFFFFFFF, sender & 0xFFFF) + samples.tobytes()
+
+
+def pack_json(samples):
+    """OpenBCI GUI style JSON packet for a (n_samples, n_channels) block."""
+    return json.dumps({'type': 'timeSeriesRaw', 'data': np.asarray(samples).T.tolist()}).encode()
+
+
+class OpenBCIReceiver:
+    def __init__(self, ip=UDP_IP, port=UDP_PORT, n_channels=3, capacity=1000, bufsize=65536):
+        self.n_channels = n_channels
+        self.ring = RingBuffer(capacity, n_channels)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((ip, port))
+        self.sock.setblocking(False)
+        self._buf = bytearray(bufsize)
+        self._view = memoryview(self._buf)
+
+        self.packets = 0
+        self.bad_packets = 0
+        self.lost_packets = 0                     # gaps in the binary sequence numbers
+        self.late_packets = 0                     # arrived after a newer one
+        self.resyncs = 0                          # new sender, or a jump of more than MAX_GAP
+        self._next_seq = None
+        self._sender = None
+        self.last_arrival = None                  # perf_counter of the poll that brought the newest samples
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def poll(self, timeout=None):
+        """Wait up to `timeout` s for data, then ingest every pending datagram.
+        Returns the number of new samples written to the ring."""
+        if timeout is None or timeout > 0:
+            ready, _, _ = select.select([self.sock], [], [], timeout)
+            if not ready:
+                return 0
+        arrived = time.perf_counter()
+        before = self.ring.total
+        while True:
+            try:
+                n = self.sock.recv_into(self._buf)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:      # Windows reports ICMP port-unreachable here
+                continue
+            try:
+                self._ingest(n)
+                self.packets += 1
+            except Exception as e:
+                self.bad_packets += 1
+                print(f"[WARN] Dropped UDP packet ({self.bad_packets} so far): {e}")
+        if self.ring.total > before:
+            self.last_arrival = arrived
+        return self.ring.total - before
+
+    def _ingest(self, n):
+        if n >= HEADER.size and self._buf[:4] == MAGIC:
+            self._ingest_binary(n)
+        else:
+            self._ingest_json(n)
+
+    def _ingest_binary(self, n):
+        _, version, c, count, seq, sender = HEADER.unpack_from(self._buf)
+        if version != VERSION:
+            raise ValueError(f"unsupported packet version {version}")
+        if n < HEADER.size + 4 * c * count:
+            raise ValueError("truncated packet")
+        if c < self.n_channels:
+            raise ValueError(f"packet has {c} channels, expected {self.n_channels}")
+        ahead = (seq - self._next_seq) & 0xFFFFFFFF if self._next_seq is not None else 0
+        if sender != self._sender or (MAX_GAP < ahead <= 0xFFFFFFFF - MAX_GAP):
+            if self._sender is not None:
+                self.resyncs += 1                 # sender (re)started: its sequence starts over
+            self._sender = sender
+            self._next_seq = (seq + 1) & 0xFFFFFFFF
+        elif ahead <= MAX_GAP:
+            self.lost_packets += ahead
+            self._next_seq = (seq + 1) & 0xFFFFFFFF
+        else:
+            self.late_packets += 1                # counted lost when it was skipped over
+            self.lost_packets = max(0, self.lost_packets - 1)
+        # View on the receive buffer; the only copy is the write into the ring
+        samples = np.frombuffer(self._view, dtype='<f4', count=c * count,
+                                offset=HEADER.size).reshape(count, c)
+        self.ring.write(samples[:, :self.n_channels])
+
+    def _ingest_json(self, n):
+        packet = json.loads(bytes(self._view[:n]))
+        if 'data' in packet:
+            self.ring.write(np.asarray(packet['data'][:self.n_channels], dtype=float).T)
+
+
+# ---------------- Sender: replay a recording -----------------
+def load_recording(path, n_channels=3):
+    """EXG columns of a tab-separated OpenBCI recording, (n_samples, n_channels)."""
+    return np.loadtxt(path, delimiter='\t', usecols=range(1, n_channels + 1), ndmin=2)
+
+
+def replay(path, fmt='binary', speed=1.0, n_channels=3, fs=250, packet_size=8,
+           ip=UDP_IP, port=UDP_PORT):
+    """Send the EXG columns of a tab-separated OpenBCI recording in `packet_size` sample packets."""
+    samples = load_recording(path, n_channels)
+    print(f"Sending {len(samples)} samples from {path} to {ip}:{port} ({fmt}, x{speed})")
+    send_samples(samples, fmt, speed, fs, packet_size, ip, port, sender=new_sender_id())
+
+
+def new_sender_id():
+    return random.getrandbits(16)
+
+
+def send_samples(samples, fmt='binary', speed=1.0, fs=250, packet_size=8, ip=UDP_IP, port=UDP_PORT, seq=0,
+                 sender=0):
+    """Send a (n_samples, n_channels) block as packets, paced at `speed` x real time (0 = no pause).
+
+    Binary packets are numbered from `seq` under sender id `sender`; returns the next
+    sequence number, so consecutive calls (several recordings, loops) with the same
+    sender continue one sequence.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    period = packet_size / fs / speed if speed else 0.0
+    next_send = time.perf_counter()
+    try:
+        for i in range(0, len(samples), packet_size):
+            block = samples[i:i + packet_size]
+            payload = pack_samples(block, seq, sender) if fmt == 'binary' else pack_json(block)
+            seq = (seq + 1) & 0xFFFFFFFF
+            sock.sendto(payload, (ip, port))
+            if period:
+                next_send += period
+                time.sleep(max(0.0, next_send - time.perf_counter()))
+    finally:
+        sock.close()
+    return seq
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("usage: python openbci_udp.py <recording.csv> [binary|json] [speed]")
+        sys.exit(1)
+    replay(sys.argv[1],
+           fmt=sys.argv[2] if len(sys.argv) > 2 else 'binary',
+           speed=float(sys.argv[3]) if len(sys.argv) > 3 else 1.0)
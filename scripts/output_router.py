@@ -0,0 +1,84 @@
+# -------------------------- Output router
+# Sends every prediction to several endpoints at once (the Quest, a Unity editor on the
+# desktop, a recorder running `python unity_protocol.py`, ...). An endpoint is a dict:
+#
+#   {'name': 'quest', 'host': '172.27.228.52', 'port': 5052,
+#    'format': 'text',          # 'text' "l,50,0,0" / 'binary' / 'label' "l", see unity_protocol.py
+#    'max_rate': None,          # messages per second at most (None = every prediction)
+#    'change_only': False, 'heartbeat': 0.5}
+#
+# or a string "host:port[/format][@max_rate]", e.g. "127.0.0.1:5053/binary@30".
+#
+# All endpoints share one non-blocking UDP socket and host names are resolved once, up
+# front: send() never waits on DNS or a full socket buffer. A datagram the OS will not
+# take right away is dropped and counted, an unreachable endpoint (ICMP port unreachable
+# shows up as an error on the next send on Windows) is counted and warned about once,
+# and neither affects the other endpoints.
+
+import socket
+from unity_protocol import UnitySender, UNITY_PORT
+
+
+def parse_endpoint(spec):
+    """Endpoint dict from a dict (returned with defaults) or a "host:port[/format][@rate]" string."""
+    if isinstance(spec, dict):
+        endpoint = dict(spec)
+    else:
+        address, _, rate = str(spec).partition('@')
+        address, _, fmt = address.partition('/')
+        host, _, port = address.rpartition(':')
+        endpoint = {'host': host or address, 'port': int(port) if host else UNITY_PORT}
+        if fmt:
+            endpoint['format'] = fmt
+        if rate:
+            endpoint['max_rate'] = float(rate)
+    endpoint.setdefault('port', UNITY_PORT)
+    endpoint.setdefault('name', f"{endpoint['host']}:{endpoint['port']}")
+    return endpoint
+
+
+class OutputRouter:
+    def __init__(self, endpoints, sock=None):
+        self.sock = sock or socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.endpoints = []              # (name, UnitySender)
+        self.dropped = {}                # name -> datagrams the socket would not take
+        self.errors = {}                 # name -> send errors (unreachable, ...)
+        for spec in endpoints:
+            endpoint = parse_endpoint(spec)
+            try:
+                address = socket.getaddrinfo(endpoint['host'], endpoint['port'], socket.AF_INET,
+                                             socket.SOCK_DGRAM)[0][4]
+            except socket.gaierror as e:
+                print(f"[WARN] Output {endpoint['name']}: cannot resolve {endpoint['host']} ({e}), left out")
+                continue
+            sender = UnitySender(self.sock, address, endpoint.get('format', 'text'),
+                                 endpoint.get('change_only', False), endpoint.get('heartbeat', 0.5),
+                                 endpoint.get('max_rate'))
+            self.endpoints.append((endpoint['name'], sender))
+            self.dropped[endpoint['name']] = 0
+            self.errors[endpoint['name']] = 0
+
+    def send(self, label, pressure=(0, 0, 0)):
+        """Send one prediction to every endpoint (each applies its own format and limits)."""
+        for name, sender in self.endpoints:
+            try:
+                sender.send(label, pressure)
+            except BlockingIOError:
+                self.dropped[name] += 1
+            except (OSError, ValueError) as e:     # unreachable, label without a binary code
+                self.errors[name] += 1
+                if self.errors[name] == 1:
+                    print(f"[WARN] Output {name}: {e} (further errors only counted)")
+
+    def describe(self):
+        return ", ".join(f"{name} ({sender.fmt}{f', max {1 / sender.min_interval:g}/s' if sender.min_interval else ''}"
+                         f"{', changes only' if sender.change_only else ''})" for name, sender in self.endpoints)
+
+    def report(self):
+        return "; ".join(f"{name}: {sender.sent} sent, {sender.skipped} unchanged, {sender.limited} over rate, "
+                         f"{self.dropped[name]} dropped, {self.errors[name]} errors"
+                         for name, sender in self.endpoints)
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,123 @@
+# -------------------------- Pipeline stages
+# Bounded queues between pipeline stages (acquisition -> inference -> output), each
+# stage in its own thread. A full queue never blocks the producer unless asked to:
+#
+#   'drop_oldest'  make room by discarding the oldest queued item
+#   'coalesce'     keep only the newest item (a new put replaces everything pending)
+#   'block'        wait for space (lossless, the producer slows down)
+#
+# Every queue counts puts, gets and drops and tracks its depth, so a slow stage shows
+# up in stats() as a queue that stays full or drops a lot.
+
+import collections
+import threading
+import time
+
+POLICIES = ('drop_oldest', 'coalesce', 'block')
+
+
+class QueueClosed(Exception):
+    pass
+
+
+class BoundedQueue:
+    def __init__(self, maxsize=1, policy='drop_oldest', name='queue'):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}', expected one of {POLICIES}")
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.name = name
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.puts = 0
+        self.gets = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self._depth_sum = 0               # depth seen by each put, for the mean
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item, timeout=None):
+        """Queue `item` according to the policy. False if it could not be queued
+        ('block' timeout, or closed)."""
+        with self._cond:
+            if self._closed:
+                return False
+            if self.policy == 'coalesce':
+                self.dropped += len(self._items)
+                self._items.clear()
+            elif len(self._items) >= self.maxsize:
+                if self.policy == 'drop_oldest':
+                    self._items.popleft()
+                    self.dropped += 1
+                elif not self._cond.wait_for(lambda: len(self._items) < self.maxsize or self._closed,
+                                             timeout=timeout) or self._closed:
+                    return False
+            self._items.append(item)
+            self.puts += 1
+            self._depth_sum += len(self._items)
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Oldest queued item. Raises TimeoutError after `timeout` s, QueueClosed once
+        the queue is closed and empty."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout=timeout):
+                raise TimeoutError
+            if not self._items:
+                raise QueueClosed
+            item = self._items.popleft()
+            self.gets += 1
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        """Wake every waiter; get() drains what is left, then raises QueueClosed."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'name': self.name,
+                'depth': len(self._items),
+                'max_depth': self.max_depth,
+                'mean_depth': self._depth_sum / self.puts if self.puts else 0.0,
+                'puts': self.puts,
+                'gets': self.gets,
+                'dropped': self.dropped,
+            }
+
+
+def format_stats(queues):
+    return " | ".join(
+        f"{s['name']}: depth {s['depth']}/{q.maxsize} (max {s['max_depth']}, "
+        f"mean {s['mean_depth']:.2f}), dropped {s['dropped']}/{s['puts']}"
+        for q, s in ((q, q.stats()) for q in queues))
+
+
+def start_stage(name, target, *args):
+    """Run `target(*args)` in a daemon thread named after the stage."""
+    thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+class StatsReporter:
+    """Prints the queue stats every `interval` s (call tick() from any stage loop)."""
+
+    def __init__(self, queues, interval=10.0):
+        self.queues = queues
+        self.interval = interval
+        self._next = time.monotonic() + interval
+
+    def tick(self):
+        if self.interval and time.monotonic() >= self._next:
+            self._next += self.interval
+            print(f"[INFO] Queues - {format_stats(self.queues)}")
@@ -0,0 +1,163 @@
+# -------------------------- Prediction journal
+# Full-session log of every prediction that costs the inference loop one deque.append:
+# log() only queues a tuple, a background thread turns whatever has queued up into one
+# NumPy record array every `flush_interval` s and appends it to the file in one write.
+#
+# File format (.pjr): 4-byte magic 'PJRN', uint32 header length, JSON header (field
+# layout = RECORD dtype, start time, script name), then fixed-size little-endian records
+# back to back. Appending is just writing more records; a file cut short by a crash
+# loses at most the last partial record. Files are rotated once they reach `max_bytes`:
+#
+#   <prefix>_<YYYYmmdd_HHMMSS>_000.pjr, ..._001.pjr, ...
+#
+# One record: wall-clock time, window index (absolute sample index where the window
+# ends), raw and final (post-processed) label, raw and filtered pressure (NaN if the
+# script predicts no pressure), arrival -> output latency and window cut -> prediction
+# time in ms (NaN if not measured).
+#
+#   python prediction_journal.py <file.pjr or directory> [out.csv]     export to CSV
+
+import collections
+import glob
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import numpy as np
+
+MAGIC = b'PJRN'
+N_PRESSURE = 3
+RECORD = np.dtype([
+    ('time', '<f8'),
+    ('window', '<i8'),
+    ('raw', 'S8'),
+    ('label', 'S8'),
+    ('pressure', '<f4', (N_PRESSURE,)),
+    ('filtered', '<f4', (N_PRESSURE,)),
+    ('latency_ms', '<f4'),
+    ('compute_ms', '<f4'),
+])
+NO_PRESSURE = (float('nan'),) * N_PRESSURE
+
+
+class PredictionJournal:
+    def __init__(self, prefix, max_bytes=64 * 1024 * 1024, flush_interval=1.0, source=None):
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.source = source or os.path.basename(sys.argv[0])
+        self.session = time.strftime('%Y%m%d_%H%M%S')
+        self.part = -1
+        self.path = None
+        self.records = 0
+        self._file = None
+        self._pending = collections.deque()      # append / popleft are atomic, no lock needed
+        self._stop = threading.Event()
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='journal', daemon=True)
+        self._thread.start()
+
+    def log(self, window, raw, label, pressure=NO_PRESSURE, filtered=NO_PRESSURE,
+            latency_ms=float('nan'), compute_ms=float('nan'), timestamp=None):
+        """Queue one prediction; returns immediately."""
+        self._pending.append((time.time() if timestamp is None else timestamp, window, raw, label,
+                              tuple(pressure), tuple(filtered), latency_ms, compute_ms))
+
+    # ---------------- Writer thread -----------------
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self._write_pending()
+        self._write_pending()
+
+    def _write_pending(self):
+        n = len(self._pending)
+        if not n:
+            return
+        rows = [self._pending.popleft() for _ in range(n)]
+        try:
+            block = np.array(rows, dtype=RECORD)
+        except (TypeError, ValueError, UnicodeError) as e:
+            print(f"[WARN] Prediction journal: dropped {n} records that do not fit the record layout: {e}")
+            return
+        written = 0
+        try:
+            while written < n:
+                if self._file is None or self._file.tell() + RECORD.itemsize > self.max_bytes:
+                    self._rotate()
+                fits = max(1, (self.max_bytes - self._file.tell()) // RECORD.itemsize)
+                self._file.write(block[written:written + fits].tobytes())
+                written += min(fits, n - written)
+            self._file.flush()
+        except (OSError, ValueError) as e:
+            self._pending.extendleft(reversed(rows[written:]))    # back in front, retried next flush
+            print(f"[WARN] Prediction journal: could not write {n - written} records, kept for a retry: {e}")
+        self.records += written
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None                      # a failed open below is retried on the next flush
+        self.part += 1
+        self.path = f"{self.prefix}_{self.session}_{self.part:03d}.pjr"
+        header = json.dumps({'dtype': RECORD.descr, 'started': self.session, 'part': self.part,
+                             'source': self.source}).encode()
+        self._file = open(self.path, 'wb')
+        self._file.write(MAGIC + struct.pack('<I', len(header)) + header)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5.0)
+        if self._file is not None:
+            self._file.close()
+            print(f"[INFO] Prediction journal: {self.records} records, last file {self.path}")
+        if self._pending:
+            print(f"[WARN] Prediction journal: {len(self._pending)} records could not be written")
+
+
+# ---------------- Reading -----------------
+def read_journal(path):
+    """(header dict, record array) of one .pjr file; a trailing partial record is ignored."""
+    with open(path, 'rb') as f:
+        if f.read(4) != MAGIC:
+            raise ValueError(f"{path} is not a prediction journal")
+        size, = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(size))
+        dtype = np.dtype([tuple(field) if len(field) == 2 else (field[0], field[1], tuple(field[2]))
+                          for field in header['dtype']])
+        data = f.read()
+    n = len(data) // dtype.itemsize
+    return header, np.frombuffer(data, dtype=dtype, count=n)
+
+
+def read_session(paths):
+    """Records of several journal files (e.g. the parts of one session) in order."""
+    return np.concatenate([read_journal(p)[1] for p in sorted(paths)])
+
+
+def export_csv(records, out):
+    k = records['pressure'].shape[1]
+    columns = (['time', 'window', 'raw', 'label'] + [f'pressure_{i + 1}' for i in range(k)]
+               + [f'filtered_{i + 1}' for i in range(k)] + ['latency_ms', 'compute_ms'])
+    with open(out, 'w') as f:
+        f.write(','.join(columns) + '\n')
+        for r in records:
+            values = ([f"{r['time']:.6f}", str(r['window']), r['raw'].decode(), r['label'].decode()]
+                      + [f"{v:g}" for v in r['pressure']] + [f"{v:g}" for v in r['filtered']]
+                      + [f"{r['latency_ms']:.3f}", f"{r['compute_ms']:.3f}"])
+            f.write(','.join(values) + '\n')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("usage: python prediction_journal.py <file.pjr or directory> [out.csv]")
+        sys.exit(1)
+    src = sys.argv[1]
+    paths = sorted(glob.glob(os.path.join(src, '*.pjr'))) if os.path.isdir(src) else [src]
+    records = read_session(paths)
+    out = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(paths[-1])[0] + '.csv'
+    export_csv(records, out)
+    print(f"{len(records)} records from {len(paths)} file(s) -> {out}")
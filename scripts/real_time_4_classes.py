@@ -1,158 +1,167 @@
 # -------------------------- Real Time Classification of Left, Right, Front, None gestures
 # This code predicts 4 classes and sends the prediction to Unity
-# When pressing Esc, the application finishes and creates a .csv with the recorded classes + timestamp
+# Stop with Ctrl+C or `python control.py stop`, the application then finishes and closes the prediction journal
 
-import socket
-import json
+import concurrent.futures
 import numpy as np
-from scipy.signal import butter, filtfilt
 import joblib
-import pandas as pd
-import keyboard 
 import time
 import os
-from datetime import datetime
+from openbci_udp import OpenBCIReceiver
+from control import ControlChannel, window_samples
+from emg_filters import FilterBank
+from emg_features import extract_features, feature_columns
+from fast_model import CompiledModel
+from latency import LatencyTracker
+from prediction_journal import PredictionJournal
+from output_router import OutputRouter
 
 # OPEN BCI SETTINGS
 UDP_IP = "127.0.0.1"  
 UDP_PORT = 12345  
 WINDOW_SIZE = 375  # samples at 250 Hz
+HOP_SIZE = 75  # new samples between consecutive (overlapping) windows
 
 # SENDING TO UNITY
 UNITY_IP = "130.229.189.54"  # Replace with your Quest/Unity machine's IP if needed
 UNITY_PORT = 5052
+# Every prediction goes to each endpoint, 'label' format = just the class ("l"); more
+# endpoints / formats / rate limits: see output_router.py
+UNITY_ENDPOINTS = [
+    {'name': 'unity', 'host': UNITY_IP, 'port': UNITY_PORT, 'format': 'label'},
+]
 
 # FUNCTIONS -----------------------------------------------------------------------
 
 lowc = 20.0
 highc = 120.0
 
-def bandpass_filter(data, lowcut=lowc, highcut=highc, fs=250, order=4):
-    nyq = 0.5 * fs  # Nyquist frequency
-    low = lowcut / nyq
-    high = highcut / nyq
-    b, a = butter(order, [low, high], btype='band')
-    return filtfilt(b, a, data)
+# Bandpass only, designed once and applied to all channels together
+filter_bank = FilterBank(fs=250, n_channels=3, band=(lowc, highc), notch=None)
 
-def rms(signal):
-    return np.sqrt(np.mean(signal**2))
-
-def zero_crossings(signal):
-    signs = np.sign(signal)
-    for i in range(1, len(signs)):
-        if signs[i] == 0:
-            signs[i] = signs[i-1] if signs[i-1] != 0 else 1
-    return np.sum(np.diff(signs) != 0)
+# ---------------------------------------------------------------------------------
 
-def waveform_length(signal):
-    return np.sum(np.abs(np.diff(signal)))
+# Non-blocking receiver, drains all pending packets (JSON or binary) into its ring
+receiver = OpenBCIReceiver(UDP_IP, UDP_PORT, n_channels=3, capacity=4 * WINDOW_SIZE)
 
-# ---------------------------------------------------------------------------------
+# Stop / pause / resume / model / window commands: signals or `python control.py <command>`
+control = ControlChannel().start()
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind((UDP_IP, UDP_PORT))
+# Per-stage latency from packet arrival to the send (p50 / p95 / p99), rewritten every 10 s
+latency = LatencyTracker(('arrival', 'window', 'filter', 'features', 'svm', 'rf', 'output'), "latency_real_time_4.txt", 10)
 
-send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+router = OutputRouter(UNITY_ENDPOINTS)
 
-print("Listening for UDP packets... (Press ESC to stop)")
+print("Listening for UDP packets... (Ctrl+C or `python control.py stop` to stop)")
 
-# Buffers for 3 channels
-buffer_ch1 = []
-buffer_ch2 = []
-buffer_ch3 = []
+# Ring buffer for the 3 channels, filled by the receiver; windows are cut from it without list copies
+ring = receiver.ring
+next_window_at = WINDOW_SIZE  # sample count at which the next window is due
 
 # Load SVM and RF models
 clf = joblib.load('C:/Quick_Disk/tonge_project/notebooks/4_classes_svm.pkl')
 clf_rf = joblib.load('C:/Quick_Disk/tonge_project/notebooks/4_classes_rf.pkl')
 
 # Features names
-cols = [f"{ch}_{feat}" for ch in ['ch_1', 'ch_2', 'ch_3'] for feat in ['RMS', 'ZC', 'WL']]
+FEATURES = ('RMS', 'ZC', 'WL')
+cols = feature_columns(['ch_1', 'ch_2', 'ch_3'], FEATURES)
 
-# Setup CSV logging
-#now = datetime.now()
-#output_dir = "data/online_annotations"
-#os.makedirs(output_dir, exist_ok=True)
-#csv_filename = f"{output_dir}/online_classes_{now.day}_{now.month}_{now.hour}_{now.minute}.csv"
-#if not os.path.exists(csv_filename):
-#    with open(csv_filename, 'w') as f:
-#        f.write("class,timestamp\n")
+# NumPy rows in, no DataFrames; fails here if the feature columns do not match
+model_svm = CompiledModel(clf, columns=cols)
+model_rf = CompiledModel(clf_rf, columns=cols)
+
+# 'model <file>' command: the file is loaded in the background and swapped in between
+# windows once it is ready, the packet loop never waits on joblib.load
+loader = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-loader')
+pending = None  # (file name, Future)
 
-try:
-    while True:
 
-        if keyboard.is_pressed('esc'):  
-            print("ESC pressed. Exiting...")
-            break
+def load_model(name):
+    return CompiledModel(joblib.load(os.path.join('C:/Quick_Disk/tonge_project/notebooks', name)), columns=cols)
 
-        data, addr = sock.recvfrom(4096)
+# Every prediction goes to a binary journal written in the background (prediction_journal.py),
+# printing each one is off unless PRINT_PREDICTIONS
+journal = PredictionJournal("data/online_annotations/real_time_4")
+PRINT_PREDICTIONS = 0
+
+try:
+    while not control.stopped:
+        # Every pending packet goes straight into the ring
+        if not receiver.poll(timeout=0.05):
+            continue
+        if control.paused:
+            # Start over with a fresh window after resume
+            next_window_at = ring.total + WINDOW_SIZE
+            continue
         try:
-            packet = json.loads(data.decode())
-
-            if 'data' in packet:
-                channel_data = packet['data']
-
-                ch1 = channel_data[0] # each batch of data has around 8 samples for each channel
-                ch2 = channel_data[1]
-                ch3 = channel_data[2]
-
-                buffer_ch1.extend(ch1)
-                buffer_ch2.extend(ch2)
-                buffer_ch3.extend(ch3)
-
-                if len(buffer_ch1) >= WINDOW_SIZE:
-                    # Convert to numpy arrays
-                    arr1 = np.array(buffer_ch1)
-                    arr2 = np.array(buffer_ch2)
-                    arr3 = np.array(buffer_ch3)
-
-                    # Bandpass filter
-                    arr1_filt = bandpass_filter(arr1)
-                    arr2_filt = bandpass_filter(arr2)
-                    arr3_filt = bandpass_filter(arr3)
-
-                    # Z-score normalization
-                    arr1_z = (arr1_filt - np.mean(arr1_filt)) / np.std(arr1_filt)
-                    arr2_z = (arr2_filt - np.mean(arr2_filt)) / np.std(arr2_filt)
-                    arr3_z = (arr3_filt - np.mean(arr3_filt)) / np.std(arr3_filt)
-
-                    # Feature extraction
-                    feats = []
-                    for ch_signal in [arr1_z, arr2_z, arr3_z]:
-                        feats.append(rms(ch_signal))
-                        feats.append(zero_crossings(ch_signal))
-                        feats.append(waveform_length(ch_signal))
-
-                    # Prediction
-                    X_live = pd.DataFrame([feats], columns=cols)
-                    prediction_svm = clf.predict(X_live)                # SVM
-                    prediction_rf = clf_rf.predict(X_live)              # RF
+            if ring.total >= next_window_at:
+                # Reconfiguration from the control channel, between windows
+                for cmd, arg in control.commands():
+                    if cmd == 'window':
+                        WINDOW_SIZE, HOP_SIZE = window_samples(arg, 250, HOP_SIZE, ring.capacity)
+                        print(f"[INFO] Window {WINDOW_SIZE} samples, hop {HOP_SIZE} samples")
+                    elif cmd == 'model':
+                        pending = (arg, loader.submit(load_model, arg))
+                # Swap the model once the background load is done, never wait for it
+                if pending is not None and pending[1].done():
+                    (name, future), pending = pending, None
+                    try:
+                        model_rf = future.result()
+                    except Exception as e:
+                        print(f"[WARN] Could not load model {name}: {e}")
+                    else:
+                        print(f"[INFO] Switched to model {name}")
+                if len(ring) < WINDOW_SIZE:
+                    next_window_at = ring.oldest + WINDOW_SIZE
+                    continue
+
+                # Latest window, (n_samples, n_channels)
+                window = ring.latest(WINDOW_SIZE)
+                now = time.perf_counter()
+                stamps = [receiver.last_arrival or now, now]
+
+                # Bandpass filter, all channels in one call
+                arr1_filt, arr2_filt, arr3_filt = filter_bank.zero_phase(window).T
+
+                # Z-score normalization
+                arr1_z = (arr1_filt - np.mean(arr1_filt)) / np.std(arr1_filt)
+                arr2_z = (arr2_filt - np.mean(arr2_filt)) / np.std(arr2_filt)
+                arr3_z = (arr3_filt - np.mean(arr3_filt)) / np.std(arr3_filt)
+
+                stamps.append(time.perf_counter())
+
+                # Feature extraction, all channels in one call
+                feats = extract_features(np.column_stack((arr1_z, arr2_z, arr3_z)), fs=250, features=FEATURES, zc_mode='sign')
+                stamps.append(time.perf_counter())
+
+                # Prediction
+                prediction_svm = model_svm.predict(feats)           # SVM
+                stamps.append(time.perf_counter())
+                prediction_rf = model_rf.predict(feats)             # RF
+                stamps.append(time.perf_counter())
+                if PRINT_PREDICTIONS:
                     print("Predicted SVM: ", prediction_svm[0], " | Predicted RF: ", prediction_rf[0])
 
-                    # Send to Unity
-                    send_sock.sendto(str(prediction_rf[0]).encode(), (UNITY_IP, UNITY_PORT))
-                    #print(f"Sent '{prediction_rf}' to Unity at {UNITY_IP}:{UNITY_PORT}")
+                # Send to Unity
+                router.send(prediction_rf[0])
+                stamps.append(time.perf_counter())
+                latency.record(stamps)
+                #print(f"Sent '{prediction_rf}' to Unity at {UNITY_IP}:{UNITY_PORT}")
 
-                    # Log prediction and timestamp
-                    #timestamp = time.time()
-                    #with open(csv_filename, 'a') as f:
-                    #    f.write(f"{prediction_rf[0]},{timestamp}\n")
+                # raw = the SVM's label, next to the RF's that is sent
+                journal.log(ring.total, prediction_svm[0], prediction_rf[0], latency_ms=(stamps[-1] - stamps[0]) * 1e3,
+                            compute_ms=(stamps[-2] - stamps[1]) * 1e3)
 
-                    # Clear buffers
-                    # Overlap windows at the end
-                    shift = 300
-                    buffer_ch1 = buffer_ch1[-shift:]
-                    buffer_ch2 = buffer_ch2[-shift:]
-                    buffer_ch3 = buffer_ch3[-shift:]
-
-                    #buffer_ch1.clear()
-                    #buffer_ch2.clear()
-                    #buffer_ch3.clear()
+                # Next window after HOP_SIZE new samples (overlap = WINDOW_SIZE - HOP_SIZE)
+                next_window_at = ring.total + HOP_SIZE
 
         except Exception as e:
-            print("Error decoding JSON:", e)
-
-except KeyboardInterrupt:
-    print("Interrupted by user.")
+            print("Error processing window:", e)
 
 finally:
-    sock.close()
\ No newline at end of file
+    control.close()
+    loader.shutdown(wait=False, cancel_futures=True)
+    latency.close()
+    journal.close()
+    router.close()
+    receiver.close()
\ No newline at end of file
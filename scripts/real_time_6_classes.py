@@ -1,35 +1,27 @@
 
 # -------------------------- Real Time Classification: Left, Left-front, Front, Right-front, Right, Swallow, None
 
-# When pressing Esc, the application finishes
+# Stop with Ctrl+C or `python control.py stop`, the application then finishes
 
+import concurrent.futures
 import socket
-import json
 import numpy as np
-from scipy.signal import butter, filtfilt, iirnotch
 import joblib
-import pandas as pd
-import keyboard 
 import time
 import os
-from datetime import datetime
 from pathlib import Path
+from openbci_udp import OpenBCIReceiver
+from control import ControlChannel, window_samples
+from emg_filters import FilterBank
+from emg_features import extract_features, feature_columns
+from fast_model import CompiledModel
+from latency import LatencyTracker
+from prediction_journal import PredictionJournal
 
 # -------------- Filter functions 
 
-def bandpass_filter(data, lowcut=5.0, highcut=50.0, fs=250.0, order=4):
-    nyq = 0.5 * fs
-    low = lowcut / nyq
-    high = highcut / nyq
-    b, a = butter(order, [low, high], btype='band')
-    return filtfilt(b, a, data)
-
-def notch_filter(signal, freq=50.0, fs=250, quality=30):
-    nyquist = 0.5 * fs
-    norm_freq = freq / nyquist
-    b, a = iirnotch(norm_freq, quality)
-    filtered_signal = filtfilt(b, a, signal)
-    return filtered_signal
+# Notch (50 Hz) + bandpass (5-50 Hz), designed once and applied to all channels together
+filter_bank = FilterBank(fs=250, n_channels=3, band=(5.0, 50.0), notch=50.0)
 
 def tkeo(signal):  # Teager-Kaiser Energy Operator 
     output = np.zeros_like(signal)
@@ -37,62 +29,34 @@ def tkeo(signal):  # Teager-Kaiser Energy Operator
         output[i] = signal[i]**2 - signal[i - 1] * signal[i + 1]  
     return output
 
-# -------------- Feature functions 
-
-def rms(signal):
-    return np.sqrt(np.mean(signal**2))
-
-def zero_crossings(signal):
-    signs = np.sign(signal)
-    for i in range(1, len(signs)):
-        if signs[i] == 0:
-            signs[i] = signs[i-1] if signs[i-1] != 0 else 1
-    return np.sum(np.diff(signs) != 0)
-
-def waveform_length(signal):
-    return np.sum(np.abs(np.diff(signal)))
-
-def mav(signal):
-    return np.mean(np.abs(signal))
-
-def iav(signal):
-    return np.sum(np.abs(signal))
-
-def rms_signed_difference(signal):
-    mean_val = np.mean(signal)
-    diff = signal - mean_val
-    return np.sqrt(np.mean(diff**2))
-
-def mean_frequency(signal, fs=250):
-    freqs = np.fft.rfftfreq(len(signal), d=1/fs) # Compute FFT
-    fft_vals = np.abs(np.fft.rfft(signal))
-    power = fft_vals ** 2
-    if np.sum(power) == 0:
-        return 0
-    mf = np.sum(freqs * power) / np.sum(power)
-    return mf
-
 # -----------------------------------------------------
 
 # OPEN BCI SETTINGS
 UDP_IP = "127.0.0.1"  
 UDP_PORT = 12345  
 WINDOW_SIZE = 125  # samples at 250 Hz
+HOP_SIZE = 50  # new samples between consecutive (overlapping) windows
 
 # SENDING TO UNITY
 #UNITY_IP = "130.229.189.54"  # Replace with Quest/Unity machine's IP 
 #UNITY_PORT = 5052
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind((UDP_IP, UDP_PORT))
+# Non-blocking receiver, drains all pending packets (JSON or binary) into its ring
+receiver = OpenBCIReceiver(UDP_IP, UDP_PORT, n_channels=3, capacity=4 * WINDOW_SIZE)
+
+# Stop / pause / resume / model / window commands: signals or `python control.py <command>`
+control = ControlChannel().start()
+
+# Per-stage latency from packet arrival to the output (p50 / p95 / p99), rewritten every 10 s
+latency = LatencyTracker(('arrival', 'window', 'filter', 'features', 'rf', 'output'), "latency_real_time_6.txt", 10)
+
 send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
-print("Listening for UDP packets... (Press ESC to stop)")
+print("Listening for UDP packets... (Ctrl+C or `python control.py stop` to stop)")
 
-# Buffers for 3 channels
-buffer_ch1 = []
-buffer_ch2 = []
-buffer_ch3 = []
+# Ring buffer for the 3 channels, filled by the receiver; windows are cut from it without list copies
+ring = receiver.ring
+next_window_at = WINDOW_SIZE  # sample count at which the next window is due
 
 # Get the directory of the current script
 script_dir = Path(__file__).resolve().parent
@@ -107,108 +71,105 @@ clf_rf = joblib.load(clf_rf_path)
 scaler = joblib.load(scaler_path)
 
 # Features names
-cols = [f"{ch}_{feat}" for ch in ['ch_1', 'ch_2', 'ch_3'] for feat in ['RMS', 'RMS_SD', 'ZC', 'WL', 'MAV', 'STD', 'VAR', 'IAV', 'MF']]
+cols = feature_columns(['ch_1', 'ch_2', 'ch_3'])
 
-# CSV logging
-#now = datetime.now()
-#output_dir = "data/online_annotations"
-#os.makedirs(output_dir, exist_ok=True)
-#csv_filename = f"{output_dir}/online_classes_{now.day}_{now.month}_{now.hour}_{now.minute}.csv"
-#if not os.path.exists(csv_filename):
-#    with open(csv_filename, 'w') as f:
-#        f.write("class,timestamp\n")
+# Scaler folded in, NumPy rows in; fails here if the feature columns do not match
+model_rf = CompiledModel(clf_rf, scaler, columns=cols)
 
-try:
-    while True:
+# 'model <file>' command: the file is loaded in the background and swapped in between
+# windows once it is ready, the packet loop never waits on joblib.load
+loader = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-loader')
+pending = None  # (file name, Future)
 
-        if keyboard.is_pressed('esc'):  
-            print("ESC pressed. Exiting...")
-            break
 
-        data, addr = sock.recvfrom(4096)
+def load_model(name):
+    return CompiledModel(joblib.load(notebooks_dir / name), scaler, columns=cols)
+
+# Every prediction goes to a binary journal written in the background (prediction_journal.py),
+# printing each one is off unless PRINT_PREDICTIONS
+journal = PredictionJournal("data/online_annotations/real_time_6")
+PRINT_PREDICTIONS = 0
+
+try:
+    while not control.stopped:
+        # Every pending packet goes straight into the ring
+        if not receiver.poll(timeout=0.05):
+            continue
+        if control.paused:
+            # Start over with a fresh window after resume
+            next_window_at = ring.total + WINDOW_SIZE
+            continue
         try:
-            packet = json.loads(data.decode())
-
-            if 'data' in packet:
-                channel_data = packet['data']
-
-                ch1 = channel_data[0] # each batch of data has around 8 samples for each channel
-                ch2 = channel_data[1]
-                ch3 = channel_data[2]
-
-                buffer_ch1.extend(ch1)
-                buffer_ch2.extend(ch2)
-                buffer_ch3.extend(ch3)
-
-                if len(buffer_ch1) >= WINDOW_SIZE:
-                    # Convert to numpy arrays
-                    arr1 = np.array(buffer_ch1)
-                    arr2 = np.array(buffer_ch2)
-                    arr3 = np.array(buffer_ch3)
-
-                    # Notch filter
-                    arr1 = notch_filter(arr1)
-                    arr2 = notch_filter(arr2)
-                    arr3 = notch_filter(arr3)
-
-                    # Bandpass filter
-                    arr1 = bandpass_filter(arr1)
-                    arr2 = bandpass_filter(arr2)
-                    arr3 = bandpass_filter(arr3)
-
-                    # TKEO
-                    arr1 = tkeo(arr1)
-                    arr2 = tkeo(arr2)
-                    arr3 = tkeo(arr3)
-
-                    # Z-score normalization
-                    #arr1_z = (arr1_filt - np.mean(arr1_filt)) / np.std(arr1_filt)
-                    #arr2_z = (arr2_filt - np.mean(arr2_filt)) / np.std(arr2_filt)
-                    #arr3_z = (arr3_filt - np.mean(arr3_filt)) / np.std(arr3_filt)
-
-                    # Feature extraction
-                    feats = []
-                    for ch_signal in [arr1, arr2, arr3]:
-                        feats.append(rms(ch_signal))
-                        feats.append(rms_signed_difference(ch_signal))
-                        feats.append(zero_crossings(ch_signal))
-                        feats.append(waveform_length(ch_signal))
-                        feats.append(mav(ch_signal))
-                        feats.append(np.std(ch_signal))
-                        feats.append(np.var(ch_signal))
-                        feats.append(iav(ch_signal))
-                        feats.append(mean_frequency(ch_signal))
-
-                    # Scale features
-                    X_live = pd.DataFrame([feats], columns=cols)
-                    X_scaled = scaler.transform(X_live)
-
-                    # Prediction
-                    X_scaled_df = pd.DataFrame(X_scaled, columns=cols)
-                    prediction_rf = clf_rf.predict(X_scaled_df)
+            if ring.total >= next_window_at:
+                # Reconfiguration from the control channel, between windows
+                for cmd, arg in control.commands():
+                    if cmd == 'window':
+                        WINDOW_SIZE, HOP_SIZE = window_samples(arg, 250, HOP_SIZE, ring.capacity)
+                        print(f"[INFO] Window {WINDOW_SIZE} samples, hop {HOP_SIZE} samples")
+                    elif cmd == 'model':
+                        pending = (arg, loader.submit(load_model, arg))
+                # Swap the model once the background load is done, never wait for it
+                if pending is not None and pending[1].done():
+                    (name, future), pending = pending, None
+                    try:
+                        model_rf = future.result()
+                    except Exception as e:
+                        print(f"[WARN] Could not load model {name}: {e}")
+                    else:
+                        print(f"[INFO] Switched to model {name}")
+                if len(ring) < WINDOW_SIZE:
+                    next_window_at = ring.oldest + WINDOW_SIZE
+                    continue
+
+                # Latest window, (n_samples, n_channels)
+                window = ring.latest(WINDOW_SIZE)
+                now = time.perf_counter()
+                stamps = [receiver.last_arrival or now, now]
+
+                # Notch + bandpass filter, all channels in one call
+                arr1, arr2, arr3 = filter_bank.zero_phase(window).T
+
+                # TKEO
+                arr1 = tkeo(arr1)
+                arr2 = tkeo(arr2)
+                arr3 = tkeo(arr3)
+
+                # Z-score normalization
+                #arr1_z = (arr1_filt - np.mean(arr1_filt)) / np.std(arr1_filt)
+                #arr2_z = (arr2_filt - np.mean(arr2_filt)) / np.std(arr2_filt)
+                #arr3_z = (arr3_filt - np.mean(arr3_filt)) / np.std(arr3_filt)
+
+                stamps.append(time.perf_counter())
+
+                # Feature extraction, all channels in one call
+                feats = extract_features(np.column_stack((arr1, arr2, arr3)), fs=250, zc_mode='sign')
+                stamps.append(time.perf_counter())
+
+                # Scale features and predict, straight from the feature row
+                prediction_rf = model_rf.predict(feats)
+                stamps.append(time.perf_counter())
+                if PRINT_PREDICTIONS:
                     print("Predicted: ", prediction_rf[0])
+                stamps.append(time.perf_counter())
+                latency.record(stamps)
 
-                    # Send to Unity
-                    #send_sock.sendto(str(prediction_rf[0]).encode(), (UNITY_IP, UNITY_PORT))
-                    #print(f"Sent '{prediction_rf}' to Unity at {UNITY_IP}:{UNITY_PORT}")
+                # Send to Unity
+                #send_sock.sendto(str(prediction_rf[0]).encode(), (UNITY_IP, UNITY_PORT))
+                #print(f"Sent '{prediction_rf}' to Unity at {UNITY_IP}:{UNITY_PORT}")
 
-                    # Log prediction and timestamp
-                    #timestamp = time.time()
-                    #with open(csv_filename, 'a') as f:
-                    #    f.write(f"{prediction_rf[0]},{timestamp}\n")
+                # one classifier and no post-processing: no raw label
+                journal.log(ring.total, '', prediction_rf[0], latency_ms=(stamps[-1] - stamps[0]) * 1e3,
+                            compute_ms=(stamps[-2] - stamps[1]) * 1e3)
 
-                    # Clear buffers
-                    # keep last 'shift' samples
-                    shift = WINDOW_SIZE - 50
-                    buffer_ch1 = buffer_ch1[-shift:]
-                    buffer_ch2 = buffer_ch2[-shift:]
-                    buffer_ch3 = buffer_ch3[-shift:]
+                # Next window after HOP_SIZE new samples (overlap = WINDOW_SIZE - HOP_SIZE)
+                next_window_at = ring.total + HOP_SIZE
 
         except Exception as e:
-            print("Error decoding JSON:", e)
-
-except KeyboardInterrupt:
-    print("Interrupted by user.")
+            print("Error processing window:", e)
 
 finally:
-    sock.close()
\ No newline at end of file
+    control.close()
+    loader.shutdown(wait=False, cancel_futures=True)
+    latency.close()
+    journal.close()
+    receiver.close()
\ No newline at end of file
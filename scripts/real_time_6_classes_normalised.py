@@ -1,34 +1,27 @@
 # -------------------------- Real Time Classification: Left, Left-front, Front, Right-front, Right, Swallow, None
 
-# When pressing Esc, the application finishes
+# Stop with Ctrl+C or `python control.py stop`, the application then finishes
 
+import concurrent.futures
 import socket
-import json
 import numpy as np
-from scipy.signal import butter, filtfilt, iirnotch
 import joblib
 import pandas as pd
-import keyboard 
 import time
 import os
 from datetime import datetime
 from pathlib import Path
+from openbci_udp import OpenBCIReceiver
+from control import ControlChannel, window_samples
+from emg_filters import FilterBank
+from emg_features import extract_features, feature_columns
+from fast_model import CompiledModel
+from latency import LatencyTracker
 
 # -------------- Filter functions 
 
-def bandpass_filter(data, lowcut=5.0, highcut=50.0, fs=250.0, order=4):
-    nyq = 0.5 * fs
-    low = lowcut / nyq
-    high = highcut / nyq
-    b, a = butter(order, [low, high], btype='band')
-    return filtfilt(b, a, data)
-
-def notch_filter(signal, freq=50.0, fs=250, quality=30):
-    nyquist = 0.5 * fs
-    norm_freq = freq / nyquist
-    b, a = iirnotch(norm_freq, quality)
-    filtered_signal = filtfilt(b, a, signal)
-    return filtered_signal
+# Notch (50 Hz) + bandpass (5-50 Hz), designed once and applied to all channels together
+filter_bank = FilterBank(fs=250, n_channels=3, band=(5.0, 50.0), notch=50.0)
 
 def tkeo(signal):  # Teager-Kaiser Energy Operator 
     output = np.zeros_like(signal)
@@ -46,58 +39,30 @@ def normalisation_max_val(signal, channel_index=None):
     max_val = max_vals[channel_index]
     return signal / max_val if max_val != 0 else signal
 
-# -------------- Feature functions 
-
-def rms(signal):
-    return np.sqrt(np.mean(signal**2))
-
-def zero_crossings(signal):
-    signs = np.sign(signal)
-    for i in range(1, len(signs)):
-        if signs[i] == 0:
-            signs[i] = signs[i-1] if signs[i-1] != 0 else 1
-    return np.sum(np.diff(signs) != 0)
-
-def waveform_length(signal):
-    return np.sum(np.abs(np.diff(signal)))
-
-def mav(signal):
-    return np.mean(np.abs(signal))
-
-def iav(signal):
-    return np.sum(np.abs(signal))
-
-def rms_signed_difference(signal):
-    mean_val = np.mean(signal)
-    diff = signal - mean_val
-    return np.sqrt(np.mean(diff**2))
-
-def mean_frequency(signal, fs=250):
-    freqs = np.fft.rfftfreq(len(signal), d=1/fs) # Compute FFT
-    fft_vals = np.abs(np.fft.rfft(signal))
-    power = fft_vals ** 2
-    if np.sum(power) == 0:
-        return 0
-    mf = np.sum(freqs * power) / np.sum(power)
-    return mf
-
 # -----------------------------------------------------
 
 # OPEN BCI SETTINGS
 UDP_IP = "127.0.0.1"  
 UDP_PORT = 12345  
 WINDOW_SIZE = 125  # samples at 250 Hz
+HOP_SIZE = 50  # new samples between consecutive (overlapping) windows
+
+# Non-blocking receiver, drains all pending packets (JSON or binary) into its ring
+receiver = OpenBCIReceiver(UDP_IP, UDP_PORT, n_channels=3, capacity=4 * WINDOW_SIZE)
+
+# Stop / pause / resume / model / window commands: signals or `python control.py <command>`
+control = ControlChannel().start()
+
+# Per-stage latency from packet arrival to the output (p50 / p95 / p99), rewritten every 10 s
+latency = LatencyTracker(('arrival', 'window', 'filter', 'features', 'rf', 'output'), "latency_real_time_6_normalised.txt", 10)
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind((UDP_IP, UDP_PORT))
 send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
-print("Listening for UDP packets... (Press ESC to stop)")
+print("Listening for UDP packets... (Ctrl+C or `python control.py stop` to stop)")
 
-# Buffers for 3 channels
-buffer_ch1 = []
-buffer_ch2 = []
-buffer_ch3 = []
+# Ring buffer for the 3 channels, filled by the receiver; windows are cut from it without list copies
+ring = receiver.ring
+next_window_at = WINDOW_SIZE  # sample count at which the next window is due
 
 # Get the directory of the current script
 script_dir = Path(__file__).resolve().parent
@@ -123,90 +88,90 @@ except Exception as e:
     raise RuntimeError(f"Could not load normalization parameters from {normalisation_file}: {e}")
 
 # Features names
-cols = [f"{ch}_{feat}" for ch in ['ch_1', 'ch_2', 'ch_3'] for feat in ['RMS', 'RMS_SD', 'ZC', 'WL', 'MAV', 'STD', 'VAR', 'IAV', 'MF']]
+cols = feature_columns(['ch_1', 'ch_2', 'ch_3'])
 
-try:
-    while True:
+# Scaler folded in, NumPy rows in; fails here if the feature columns do not match
+model_rf = CompiledModel(clf_rf, scaler, columns=cols)
 
-        if keyboard.is_pressed('esc'):  
-            print("ESC pressed. Exiting...")
-            break
+# 'model <file>' command: the file is loaded in the background and swapped in between
+# windows once it is ready, the packet loop never waits on joblib.load
+loader = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-loader')
+pending = None  # (file name, Future)
 
-        data, addr = sock.recvfrom(4096)
+
+def load_model(name):
+    return CompiledModel(joblib.load(notebooks_dir / name), scaler, columns=cols)
+
+try:
+    while not control.stopped:
+        # Every pending packet goes straight into the ring
+        if not receiver.poll(timeout=0.05):
+            continue
+        if control.paused:
+            # Start over with a fresh window after resume
+            next_window_at = ring.total + WINDOW_SIZE
+            continue
         try:
-            packet = json.loads(data.decode())
-
-            if 'data' in packet:
-                channel_data = packet['data']
-
-                ch1 = channel_data[0] # each batch of data has around 8 samples for each channel
-                ch2 = channel_data[1]
-                ch3 = channel_data[2]
-
-                buffer_ch1.extend(ch1)
-                buffer_ch2.extend(ch2)
-                buffer_ch3.extend(ch3)
-
-                if len(buffer_ch1) >= WINDOW_SIZE:
-                    # Convert to numpy arrays
-                    arr1 = np.array(buffer_ch1)
-                    arr2 = np.array(buffer_ch2)
-                    arr3 = np.array(buffer_ch3)
-
-                    # Notch filter
-                    arr1 = notch_filter(arr1)
-                    arr2 = notch_filter(arr2)
-                    arr3 = notch_filter(arr3)
-
-                    # Bandpass filter
-                    arr1 = bandpass_filter(arr1)
-                    arr2 = bandpass_filter(arr2)
-                    arr3 = bandpass_filter(arr3)
-
-                    # TKEO
-                    arr1 = tkeo(arr1)
-                    arr2 = tkeo(arr2)
-                    arr3 = tkeo(arr3)
-
-                    # Normalisation
-                    arr1 = normalisation_max_val(arr1, 0)
-                    arr2 = normalisation_max_val(arr2, 1)
-                    arr3 = normalisation_max_val(arr3, 2)
-
-                    # Feature extraction
-                    feats = []
-                    for ch_signal in [arr1, arr2, arr3]:
-                        feats.append(rms(ch_signal))
-                        feats.append(rms_signed_difference(ch_signal))
-                        feats.append(zero_crossings(ch_signal))
-                        feats.append(waveform_length(ch_signal))
-                        feats.append(mav(ch_signal))
-                        feats.append(np.std(ch_signal))
-                        feats.append(np.var(ch_signal))
-                        feats.append(iav(ch_signal))
-                        feats.append(mean_frequency(ch_signal))
-
-                    # Scale features
-                    X_live = pd.DataFrame([feats], columns=cols)
-                    X_scaled = scaler.transform(X_live)
-
-                    # Prediction
-                    X_scaled_df = pd.DataFrame(X_scaled, columns=cols)
-                    prediction_rf = clf_rf.predict(X_scaled_df)
-                    print("Predicted: ", prediction_rf[0])
-
-                    # Clear buffers
-                    # keep last 'shift' samples
-                    shift = WINDOW_SIZE - 50
-                    buffer_ch1 = buffer_ch1[-shift:]
-                    buffer_ch2 = buffer_ch2[-shift:]
-                    buffer_ch3 = buffer_ch3[-shift:]
+            if ring.total >= next_window_at:
+                # Reconfiguration from the control channel, between windows
+                for cmd, arg in control.commands():
+                    if cmd == 'window':
+                        WINDOW_SIZE, HOP_SIZE = window_samples(arg, 250, HOP_SIZE, ring.capacity)
+                        print(f"[INFO] Window {WINDOW_SIZE} samples, hop {HOP_SIZE} samples")
+                    elif cmd == 'model':
+                        pending = (arg, loader.submit(load_model, arg))
+                # Swap the model once the background load is done, never wait for it
+                if pending is not None and pending[1].done():
+                    (name, future), pending = pending, None
+                    try:
+                        model_rf = future.result()
+                    except Exception as e:
+                        print(f"[WARN] Could not load model {name}: {e}")
+                    else:
+                        print(f"[INFO] Switched to model {name}")
+                if len(ring) < WINDOW_SIZE:
+                    next_window_at = ring.oldest + WINDOW_SIZE
+                    continue
+
+                # Latest window, (n_samples, n_channels)
+                window = ring.latest(WINDOW_SIZE)
+                now = time.perf_counter()
+                stamps = [receiver.last_arrival or now, now]
+
+                # Notch + bandpass filter, all channels in one call
+                arr1, arr2, arr3 = filter_bank.zero_phase(window).T
+
+                # TKEO
+                arr1 = tkeo(arr1)
+                arr2 = tkeo(arr2)
+                arr3 = tkeo(arr3)
+
+                # Normalisation
+                arr1 = normalisation_max_val(arr1, 0)
+                arr2 = normalisation_max_val(arr2, 1)
+                arr3 = normalisation_max_val(arr3, 2)
+
+                stamps.append(time.perf_counter())
+
+                # Feature extraction, all channels in one call
+                feats = extract_features(np.column_stack((arr1, arr2, arr3)), fs=250, zc_mode='sign')
+                stamps.append(time.perf_counter())
+
+                # Scale features and predict, straight from the feature row
+                prediction_rf = model_rf.predict(feats)
+                stamps.append(time.perf_counter())
+                print("Predicted: ", prediction_rf[0])
+                stamps.append(time.perf_counter())
+                latency.record(stamps)
+
+                # Next window after HOP_SIZE new samples (overlap = WINDOW_SIZE - HOP_SIZE)
+                next_window_at = ring.total + HOP_SIZE
 
         except Exception as e:
-            print("Error decoding JSON:", e)
-
-except KeyboardInterrupt:
-    print("Interrupted by user.")
+            print("Error processing window:", e)
 
 finally:
-    sock.close()
+    control.close()
+    loader.shutdown(wait=False, cancel_futures=True)
+    latency.close()
+    receiver.close()
@@ -0,0 +1,69 @@
+# -------------------------- Ring buffer for multichannel EMG
+# Fixed-capacity float buffer shaped (capacity, channels). Whole packets are written
+# with at most two slice copies, and windows are returned as views into the storage;
+# a copy is only made when the requested window wraps around the end.
+#
+# Samples are addressed by their absolute index (0 = first sample ever written), so
+# a consumer can keep its own cursor and ask for window(start, n) later on.
+
+import numpy as np
+
+
+class RingBuffer:
+    def __init__(self, capacity, n_channels, dtype=np.float64):
+        self.capacity = int(capacity)
+        self.n_channels = n_channels
+        self.data = np.zeros((self.capacity, n_channels), dtype=dtype)
+        self.total = 0    # samples written so far = absolute index of the next sample
+        self._floor = 0   # samples before this index were discarded by clear()
+
+    def __len__(self):
+        return min(self.total - self._floor, self.capacity)
+
+    @property
+    def oldest(self):
+        """Absolute index of the oldest sample still stored."""
+        return self.total - len(self)
+
+    def write(self, block):
+        """Append a (n, n_channels) block. Blocks longer than the capacity keep their tail."""
+        block = np.asarray(block)
+        n = len(block)
+        if n == 0:
+            return
+        if n > self.capacity:
+            self.total += n - self.capacity
+            block = block[-self.capacity:]
+            n = self.capacity
+
+        start = self.total % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[start:start + first] = block[:first]
+        if first < n:
+            self.data[:n - first] = block[first:]
+        self.total += n
+
+    def window(self, start, n):
+        """Samples [start, start + n) by absolute index.
+
+        Returns a view when the window is contiguous in storage, otherwise a copy.
+        A view stays valid until capacity - n further samples have been written.
+        """
+        if start < self.oldest or start + n > self.total:
+            raise IndexError(f"samples [{start}, {start + n}) not in buffer "
+                             f"[{self.oldest}, {self.total})")
+        s = start % self.capacity
+        if s + n <= self.capacity:
+            return self.data[s:s + n]
+        return np.concatenate((self.data[s:], self.data[:s + n - self.capacity]))
+
+    def latest(self, n):
+        """The n most recent samples."""
+        return self.window(self.total - n, n)
+
+    def clear(self, total=None):
+        """Forget the stored samples; absolute indices keep counting, or continue from
+        `total` (e.g. after a gap the data will not be filled in for)."""
+        if total is not None:
+            self.total = total
+        self._floor = self.total
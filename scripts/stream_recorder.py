@@ -0,0 +1,290 @@
+# -------------------------- Stream recorder
+# Writes samples to disk as they arrive instead of keeping the session in memory. Every
+# write() appends one block: the window id and label the samples belong to (-1 / '' for
+# a continuous, unlabelled recording), the time.perf_counter() at which the last sample
+# of the block arrived, and the samples themselves as float32, so memory use is one
+# chunk however long the session. The file is flushed and fsync'ed every
+# `fsync_interval` s (and on close): a crash loses at most that much, and a block cut
+# short is skipped when reading.
+#
+# File format (.srec): 4-byte magic 'SREC', uint32 header length, JSON header (channel
+# names, sampling rate, start time, script name, block layout), then blocks of
+#
+#   int32 window id, uint32 sample count n, 8-byte label (ASCII, zero padded),
+#   float64 arrival time (NaN if unknown; only in files with "timed": true),
+#   n x n_channels float32 (little endian, sample-major)
+#
+# Several blocks may share a window id (a window streamed in chunks).
+#
+# Annotations: AnnotationLog appends "time,label" lines (same clock) next to a continuous
+# recording. Labelled windows are cut afterwards: a first pass over the block headers
+# only (the samples are seeked past) maps each annotation to a sample index through the
+# block arrival times, a second one copies the windows out block by block, so the window
+# length is only chosen at that point and memory stays at the windows open at a time.
+#
+#   python stream_recorder.py <file.srec> [out.csv]
+#
+# exports to the CSV layout of the loggers (window,label,ch_1,ch_2,ch_3), block by
+# block, so the export does not need the recording in memory either; with an
+# annotation file (<file>_annotations.csv) next to the recording, the labelled windows
+# are exported instead:
+#
+#   python stream_recorder.py <file.srec> [out.csv] [window seconds, default 3]
+
+import json
+import math
+import os
+import struct
+import sys
+import threading
+import time
+import numpy as np
+
+MAGIC = b'SREC'
+BLOCK = struct.Struct('<iI8s')
+TIMED_BLOCK = struct.Struct('<iI8sd')
+
+
+class StreamRecorder:
+    def __init__(self, path, channels=('ch_1', 'ch_2', 'ch_3'), sampling_rate=None, fsync_interval=2.0,
+                 source=None):
+        self.path = path
+        self.channels = list(channels)
+        self.fsync_interval = fsync_interval
+        self.samples = 0
+        self.blocks = 0
+        # The loggers write from their one drain loop (key presses only go to the AnnotationLog,
+        # from the keyboard listener thread); the lock keeps write() and close() safe anyway
+        # if they are called from different threads
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        header = json.dumps({'channels': self.channels, 'sampling_rate': sampling_rate, 'timed': True,
+                             'started': time.strftime('%Y-%m-%d %H:%M:%S'),
+                             'source': source or os.path.basename(sys.argv[0])}).encode()
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC + struct.pack('<I', len(header)) + header)
+        self._synced_at = time.perf_counter()
+
+    def write(self, window, label, samples, arrived=None):
+        """Append (n, n_channels) samples of window `window` labelled `label`; `arrived` is
+        the time.perf_counter() at which the last of them arrived."""
+        samples = np.asarray(samples, dtype='<f4')
+        if samples.ndim != 2 or samples.shape[1] != len(self.channels):
+            raise ValueError(f"Expected (n, {len(self.channels)}) samples, got {samples.shape}")
+        with self._lock:
+            if self._file.closed:              # a write racing close()
+                return
+            self._file.write(TIMED_BLOCK.pack(window, len(samples), str(label).encode('ascii')[:8],
+                                              math.nan if arrived is None else arrived))
+            self._file.write(samples.tobytes())
+            self.samples += len(samples)
+            self.blocks += 1
+            if time.perf_counter() - self._synced_at >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced_at = time.perf_counter()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._sync()
+            self._file.close()
+
+
+class AnnotationLog:
+    """Appends "time,label" lines (time.perf_counter(), the clock of the recording blocks);
+    each line is flushed right away, it is one short write per key press."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.last = None                       # time of the latest annotation
+        self._lock = threading.Lock()
+        self._file = open(path, 'w')
+        self._file.write("time,label\n")
+        self._file.flush()
+
+    def mark(self, label, at=None):
+        at = time.perf_counter() if at is None else at
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(f"{at:.6f},{label}\n")
+            self._file.flush()
+            self.count += 1
+            self.last = at
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def annotations_path(recording_path):
+    return os.path.splitext(recording_path)[0] + '_annotations.csv'
+
+
+# ---------------- Reading -----------------
+def iter_blocks(path, samples=True):
+    """Header dict, then (window, label, arrival time, samples) per block; a block cut
+    short is skipped. With samples=False the data is seeked past and the last item is the
+    sample count instead."""
+    end = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        if f.read(4) != MAGIC:
+            raise ValueError(f"{path} is not a stream recording")
+        size, = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(size))
+        yield header
+        row_bytes = 4 * len(header['channels'])
+        block = TIMED_BLOCK if header.get('timed') else BLOCK
+        while True:
+            head = f.read(block.size)
+            if len(head) < block.size:
+                return
+            window, n, label, *arrived = block.unpack(head)
+            if samples:
+                data = f.read(n * row_bytes)
+                if len(data) < n * row_bytes:
+                    return
+                data = np.frombuffer(data, '<f4').reshape(n, len(header['channels']))
+            else:
+                if f.tell() + n * row_bytes > end:
+                    return
+                f.seek(n * row_bytes, os.SEEK_CUR)
+                data = n
+            yield window, label.rstrip(b'\0').decode('ascii'), arrived[0] if arrived else math.nan, data
+
+
+def read_recording(path):
+    """(header, window ids, labels, samples) with one entry per sample."""
+    blocks = iter_blocks(path)
+    header = next(blocks)
+    windows, labels, samples = [], [], []
+    for window, label, _, block in blocks:
+        windows.append(np.full(len(block), window, dtype=np.int32))
+        labels.append(np.full(len(block), label, dtype=object))
+        samples.append(block)
+    if not samples:
+        return header, np.zeros(0, np.int32), np.zeros(0, object), np.zeros((0, len(header['channels'])), '<f4')
+    return header, np.concatenate(windows), np.concatenate(labels), np.concatenate(samples)
+
+
+def read_clock(path):
+    """(header, block ends, block arrival times) of a continuous recording, from the block
+    headers only; block end = number of samples up to and including the block."""
+    blocks = iter_blocks(path, samples=False)
+    header = next(blocks)
+    counts, times = [], []
+    for _, _, arrived, n in blocks:
+        counts.append(n)
+        times.append(arrived)
+    return header, np.cumsum(counts, dtype=np.int64), np.array(times, dtype=float)
+
+
+def read_annotations(path):
+    """(times, labels) of an AnnotationLog file."""
+    times, labels = [], []
+    with open(path) as f:
+        next(f, None)
+        for line in f:
+            at, _, label = line.rstrip('\n').partition(',')
+            if label:
+                times.append(float(at))
+                labels.append(label)
+    return np.array(times, dtype=float), np.array(labels, dtype=object)
+
+
+def sample_index(ends, times, at, sampling_rate):
+    """Index of the first sample arriving at or after each time in `at`, interpolated
+    between the arrival times of the blocks and extrapolated at the sampling rate before
+    the first / after the last one; -1 for every time if no block has an arrival time."""
+    at = np.asarray(at, dtype=float)
+    valid = np.isfinite(times)
+    if not valid.any():
+        return np.full(len(at), -1, dtype=np.int64)
+    times, ends = times[valid], ends[valid]
+    index = np.interp(at, times, ends)
+    before, after = at < times[0], at > times[-1]
+    index[before] = ends[0] - (times[0] - at[before]) * sampling_rate
+    index[after] = ends[-1] + (at[after] - times[-1]) * sampling_rate
+    return np.round(index).astype(np.int64)
+
+
+def iter_windows(path, starts, length):
+    """(length, n_channels) windows starting at the sample indices `starts` (ascending,
+    all within the recording), copied out while the blocks are read."""
+    blocks = iter_blocks(path)
+    n_channels = len(next(blocks)['channels'])
+    open_windows = {}                          # index into starts -> window being filled
+    following = 0                              # next window to open
+    offset = 0                                 # index of the block's first sample
+    for _, _, _, block in blocks:
+        end = offset + len(block)
+        while following < len(starts) and starts[following] < end:
+            open_windows[following] = np.empty((length, n_channels), '<f4')
+            following += 1
+        for i in list(open_windows):           # opened in order, all the same length: they fill in order
+            start = starts[i]
+            lo, hi = max(start, offset), min(start + length, end)
+            open_windows[i][lo - start:hi - start] = block[lo - offset:hi - offset]
+            if start + length <= end:
+                yield open_windows.pop(i)
+        offset = end
+
+
+def export_windows(path, annotations, out, seconds):
+    """Cut a `seconds` window after every annotation and write them as window,label,<channels>
+    rows (windows numbered from 1); returns the labels of the windows written."""
+    header, ends, times = read_clock(path)
+    at, labels = read_annotations(annotations)
+    length = int(round(seconds * header['sampling_rate']))
+    starts = sample_index(ends, times, at, header['sampling_rate'])
+    kept = (starts >= 0) & (starts + length <= (ends[-1] if len(ends) else 0))
+    if not kept.all() and not np.isfinite(times).any():
+        print(f"[WARN] {path} holds no samples, {len(at)} annotation(s) left out")
+    elif not kept.all():
+        print(f"[WARN] {int((~kept).sum())} annotation(s) without a full {seconds:g}s window left out")
+    order = np.argsort(starts[kept], kind='stable')
+    starts, labels = starts[kept][order], labels[kept][order]
+    with open(out, 'w', newline='') as f:
+        f.write(','.join(['window', 'label'] + header['channels']) + '\n')
+        for number, (label, window) in enumerate(zip(labels, iter_windows(path, starts, length)), start=1):
+            prefix = f"{number},{label},"
+            f.writelines(prefix + ','.join(row) + '\n' for row in window.astype(str).tolist())
+    return labels
+
+
+def export_csv(path, out):
+    """Write the recording as window,label,<channels> rows; returns the number of rows."""
+    blocks = iter_blocks(path)
+    header = next(blocks)
+    rows = 0
+    with open(out, 'w', newline='') as f:
+        f.write(','.join(['window', 'label'] + header['channels']) + '\n')
+        for window, label, _, block in blocks:
+            prefix = f"{window},{label},"
+            # float32 -> str gives the shortest round-trip repr (12.3, not 12.300000190734863)
+            f.writelines(prefix + ','.join(row) + '\n' for row in block.astype(str).tolist())
+            rows += len(block)
+    return rows
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("usage: python stream_recorder.py <file.srec> [out.csv] [window seconds]")
+        sys.exit(1)
+    src = sys.argv[1]
+    out = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(src)[0] + '.csv'
+    if os.path.exists(annotations_path(src)):
+        seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 3.0
+        labels = export_windows(src, annotations_path(src), out, seconds)
+        print(f"{len(labels)} windows of {seconds:g}s -> {out}")
+    else:
+        print(f"{export_csv(src, out)} rows -> {out}")
@@ -0,0 +1,234 @@
+# -------------------------- Unity protocol
+# Predictions go to Unity (UDP_Listener.cs, port 5052) in one of two formats:
+#
+#   text     "l,50,0,0"  label and the three pressures as ints, what every build of the
+#            listener understands
+#   label    "l"  the label only, as the OpenBCI real_time_* scripts send it
+#   binary   24 bytes, little endian, version 2:
+#
+#              offset  type    field
+#              0       uint8   MAGIC 0xA5 (never the first byte of a text message)
+#              1       uint8   version
+#              2       uint8   flags (bit 0: heartbeat, nothing changed since the last message)
+#              3       uint8   label code, index into LABELS
+#              4       uint32  sequence number, +1 per message, wraps around
+#              8       uint16  session, random per sender; the sequence restarts with it
+#              10      uint64  send time, time.perf_counter_ns() // 1000 (monotonic, us)
+#              18      int16   pressure x 3, clipped
+#
+# The sequence number lets the receiver drop stale datagrams and count loss; the send
+# time gives the one-way latency when both ends are on the same machine. A restarted
+# classifier starts a new session at sequence 0: receivers start over on a new session
+# (UDP_Listener.cs also after a gap of more than a second) instead of taking the new
+# messages for stale ones.
+#
+# UnitySender can send only when the label or the pressures change, plus a heartbeat
+# every `heartbeat` s so Unity can tell "nothing changed" from "sender gone". Off by
+# default: the tasks count consecutive predictions, so they expect one message per window.
+# `max_rate` caps the messages per second (predictions in between are skipped).
+#
+#   python unity_protocol.py [port] [seconds]
+#
+# is a stand-in for the Unity listener: it decodes both formats and reports messages/s,
+# loss, late (reordered) and duplicate datagrams, latency and the decode cost.
+
+import math
+import random
+import socket
+import struct
+import sys
+import time
+from latency import Histogram
+
+MAGIC = 0xA5
+VERSION = 2
+HEARTBEAT = 0x01
+LABELS = ('n', 'l', 'f', 'r', 's', 'lf', 'rf')   # label code = index; append, never reorder
+LABEL_CODES = {label: code for code, label in enumerate(LABELS)}
+N_PRESSURE = 3
+MESSAGE = struct.Struct(f'<BBBBIHQ{N_PRESSURE}h')
+UNITY_PORT = 5052
+
+
+def _int16(value):
+    return max(-32768, min(32767, int(value)))
+
+
+def encode_text(label, pressure):
+    return f"{label},{','.join(str(int(p)) for p in pressure)}".encode('utf-8')
+
+
+def encode_binary(label, pressure, seq, timestamp_us=None, flags=0, session=0):
+    if timestamp_us is None:
+        timestamp_us = time.perf_counter_ns() // 1000
+    code = LABEL_CODES.get(label)
+    if code is None:
+        raise ValueError(f"Label {label!r} has no code, expected one of {LABELS}")
+    return MESSAGE.pack(MAGIC, VERSION, flags, code, seq & 0xFFFFFFFF, session & 0xFFFF, timestamp_us,
+                        *(_int16(p) for p in pressure))
+
+
+def decode(data):
+    """(label, pressure tuple, seq, timestamp_us, flags, session) of either format; seq,
+    timestamp_us and session are None for text messages."""
+    if data and data[0] == MAGIC:
+        if len(data) != MESSAGE.size or data[1] != VERSION:
+            raise ValueError(f"Unsupported binary message (version {data[1] if len(data) > 1 else '?'}, "
+                             f"{len(data)} bytes)")
+        _, _, flags, code, seq, session, timestamp_us, *pressure = MESSAGE.unpack(data)
+        if code >= len(LABELS):
+            raise ValueError(f"Unknown label code {code}")
+        return LABELS[code], tuple(pressure), seq, timestamp_us, flags, session
+    parts = data.decode('ascii').strip().lower().split(',')
+    if len(parts) != 1 + N_PRESSURE:
+        raise ValueError(f"Invalid text message {data!r}")
+    return parts[0], tuple(int(p) for p in parts[1:]), None, None, 0, None
+
+
+FORMATS = ('text', 'binary', 'label')
+
+
+class UnitySender:
+    def __init__(self, sock, address, fmt='text', change_only=False, heartbeat=0.5, max_rate=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}, expected one of {FORMATS}")
+        self.sock = sock
+        self.address = address
+        self.fmt = fmt
+        self.change_only = change_only
+        self.heartbeat = heartbeat
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.seq = 0
+        self.session = random.getrandbits(16)
+        self.sent = 0
+        self.skipped = 0           # unchanged (change-only mode)
+        self.limited = 0           # over max_rate
+        self._last = None          # (label, pressure ints) of the last message
+        self._last_at = 0.0
+
+    def send(self, label, pressure):
+        """Send one prediction; returns False if change-only mode or the rate limit skipped it."""
+        state = (label, tuple(int(p) for p in pressure))
+        now = time.perf_counter()
+        if now - self._last_at < self.min_interval:
+            self.limited += 1
+            return False
+        flags = 0
+        if self.change_only and state == self._last:
+            if now - self._last_at < self.heartbeat:
+                self.skipped += 1
+                return False
+            flags = HEARTBEAT
+        if self.fmt == 'binary':
+            message = encode_binary(label, state[1], self.seq, int(now * 1e6), flags, self.session)
+        elif self.fmt == 'text':
+            message = encode_text(label, state[1])
+        else:
+            message = str(label).encode('utf-8')
+        self.sock.sendto(message, self.address)
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        self.sent += 1
+        self._last = state
+        self._last_at = now
+        return True
+
+
+# ---------------- Stand-in receiver -----------------
+class ReceiverStats:
+    def __init__(self):
+        self.received = 0
+        self.text = 0
+        self.heartbeats = 0
+        self.invalid = 0
+        self.lost = 0
+        self.late = 0
+        self.duplicates = 0
+        self.sessions = 0
+        self.decode_s = 0.0
+        self.latency = Histogram()
+        self._next_seq = None
+        self._missing = set()                   # skipped sequence numbers that may still arrive
+        self._session = None
+
+    def add(self, data, arrived_us):
+        start = time.perf_counter()
+        try:
+            label, pressure, seq, timestamp_us, flags, session = decode(data)
+        except (ValueError, UnicodeDecodeError):
+            self.invalid += 1
+            return None
+        self.decode_s += time.perf_counter() - start
+        self.received += 1
+        if seq is None:
+            self.text += 1
+            return label, pressure
+        if flags & HEARTBEAT:
+            self.heartbeats += 1
+        self.latency.add(max(0, arrived_us - timestamp_us) / 1e6)
+        if session != self._session:            # sender (re)started: its sequence starts over
+            self._session = session
+            self.sessions += 1
+            self._next_seq = seq
+            self._missing.clear()
+        ahead = (seq - self._next_seq) & 0xFFFFFFFF
+        if ahead < 0x80000000:
+            self.lost += ahead                  # datagrams skipped over (for now)
+            if len(self._missing) > 4096:
+                self._missing.clear()           # long gone, they stay counted as lost
+            if ahead <= 1024:
+                self._missing.update((self._next_seq + i) & 0xFFFFFFFF for i in range(ahead))
+            self._next_seq = (seq + 1) & 0xFFFFFFFF
+        elif seq in self._missing:
+            self._missing.discard(seq)          # arrived after a newer one: Unity drops it
+            self.late += 1
+            self.lost -= 1
+        else:
+            self.duplicates += 1
+        return label, pressure
+
+    def report(self, elapsed):
+        binary = self.received - self.text
+        decode_us = self.decode_s / self.received * 1e6 if self.received else math.nan
+        lines = [f"{self.received} messages in {elapsed:.1f}s ({self.received / elapsed:.1f}/s): "
+                 f"{binary} binary ({self.heartbeats} heartbeats, {self.sessions} sessions), {self.text} text, "
+                 f"{self.invalid} invalid"]
+        if binary:
+            lost_pct = 100 * self.lost / (binary + self.lost)
+            lines.append(f"  lost {self.lost} ({lost_pct:.2f}%), late {self.late}, duplicates {self.duplicates}, "
+                         f"latency p50 {self.latency.percentile(50) * 1e3:.2f} ms "
+                         f"p99 {self.latency.percentile(99) * 1e3:.2f} ms (same machine only)")
+        lines.append(f"  decode {decode_us:.2f} us/message ({1e6 / decode_us:.0f} messages/s)"
+                     if self.received else "  decode -")
+        return "\n".join(lines)
+
+
+def receive(port=UNITY_PORT, seconds=None, report_every=5.0):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('0.0.0.0', port))
+    sock.settimeout(0.5)
+    stats = ReceiverStats()
+    start = time.perf_counter()
+    next_report = start + report_every
+    print(f"Listening on UDP {port} (text and binary v{VERSION}), Ctrl+C to stop")
+    try:
+        while seconds is None or time.perf_counter() - start < seconds:
+            try:
+                data = sock.recv(2048)
+            except socket.timeout:
+                data = None
+            if data:
+                stats.add(data, time.perf_counter_ns() // 1000)
+            if time.perf_counter() >= next_report:
+                next_report += report_every
+                print(stats.report(time.perf_counter() - start))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+    print(stats.report(time.perf_counter() - start))
+    return stats
+
+
+if __name__ == '__main__':
+    receive(int(sys.argv[1]) if len(sys.argv) > 1 else UNITY_PORT,
+            float(sys.argv[2]) if len(sys.argv) > 2 else None)
@@ -14,6 +14,23 @@ public class UDP_Listener : MonoBehaviour
     public string currentClass = "n";
     public int[] currentPressure = new int[3];
 
+    // Binary messages (scripts/unity_protocol.py): 24 bytes, little endian
+    // magic, version, flags, label code, uint32 sequence, uint16 session, uint64 send time (us),
+    // 3 x int16 pressure. Text messages ("l,50,0,0") are still accepted.
+    private const byte Magic = 0xA5;
+    private const byte ProtocolVersion = 2;
+    private const int BinaryLength = 24;
+    // A restarted sender starts a new session at sequence 0; after a pause this long the
+    // sequence is not compared either
+    private const double SessionGapSeconds = 1.0;
+    private static readonly string[] Labels = { "n", "l", "f", "r", "s", "lf", "rf" };
+
+    private bool haveSequence = false;
+    private uint lastSequence;
+    private ushort lastSession;
+    private DateTime lastBinaryAt;
+    public int staleMessages = 0;   // binary messages dropped because a newer one had arrived
+
     // Define a struct to hold both class and pressure data
     public struct UdpData
     {
@@ -49,33 +66,65 @@ public class UDP_Listener : MonoBehaviour
             try
             {
                 byte[] data = udpClient.Receive(ref remoteEndPoint);
-                string message = Encoding.ASCII.GetString(data).Trim().ToLower();
-
-                string[] parts = message.Split(',');
 
-                if (parts.Length == 4)
+                string pos;
+                int p0, p1, p2;
+                if (data.Length > 0 && data[0] == Magic)
                 {
-                    string pos = parts[0];
-                    int p0 = int.Parse(parts[1]);
-                    int p1 = int.Parse(parts[2]);
-                    int p2 = int.Parse(parts[3]);
-
-                    lock (this)
+                    if (data.Length != BinaryLength || data[1] != ProtocolVersion || data[3] >= Labels.Length)
+                    {
+                        Debug.LogWarning("Unsupported binary UDP message (" + data.Length + " bytes)");
+                        continue;
+                    }
+                    uint sequence = ReadUInt32(data, 4);
+                    ushort session = (ushort)(data[8] | data[9] << 8);
+                    DateTime now = DateTime.UtcNow;
+                    if (haveSequence && (session != lastSession || (now - lastBinaryAt).TotalSeconds > SessionGapSeconds))
+                    {
+                        haveSequence = false;   // new sender session or long pause: start over
+                    }
+                    lastBinaryAt = now;
+                    // Drop datagrams older than the last one (sequence wraps around)
+                    if (haveSequence && (int)(sequence - lastSequence) <= 0)
                     {
-                        currentClass = pos;
-                        currentPressure[0] = p0;
-                        currentPressure[1] = p1;
-                        currentPressure[2] = p2;
+                        staleMessages++;
+                        continue;
                     }
+                    haveSequence = true;
+                    lastSequence = sequence;
+                    lastSession = session;
 
-                    // Create a new UdpData object and enqueue it
-                    UdpData udpData = new UdpData(pos, new int[] { p0, p1, p2 });
-                    mainThreadQueue.Enqueue(udpData);
+                    pos = Labels[data[3]];
+                    p0 = ReadInt16(data, 18);
+                    p1 = ReadInt16(data, 20);
+                    p2 = ReadInt16(data, 22);
                 }
                 else
                 {
-                    Debug.LogWarning("Invalid UDP message format: " + message);
+                    string message = Encoding.ASCII.GetString(data).Trim().ToLower();
+                    string[] parts = message.Split(',');
+                    if (parts.Length != 4)
+                    {
+                        Debug.LogWarning("Invalid UDP message format: " + message);
+                        continue;
+                    }
+                    pos = parts[0];
+                    p0 = int.Parse(parts[1]);
+                    p1 = int.Parse(parts[2]);
+                    p2 = int.Parse(parts[3]);
+                }
+
+                lock (this)
+                {
+                    currentClass = pos;
+                    currentPressure[0] = p0;
+                    currentPressure[1] = p1;
+                    currentPressure[2] = p2;
                 }
+
+                // Create a new UdpData object and enqueue it
+                UdpData udpData = new UdpData(pos, new int[] { p0, p1, p2 });
+                mainThreadQueue.Enqueue(udpData);
             }
             catch (Exception ex)
             {
@@ -84,6 +133,16 @@ public class UDP_Listener : MonoBehaviour
         }
     }
 
+    private static uint ReadUInt32(byte[] data, int offset)
+    {
+        return (uint)(data[offset] | data[offset + 1] << 8 | data[offset + 2] << 16 | data[offset + 3] << 24);
+    }
+
+    private static int ReadInt16(byte[] data, int offset)
+    {
+        return (short)(data[offset] | data[offset + 1] << 8);
+    }
+
     void Update()
     {
         while (mainThreadQueue.TryDequeue(out UdpData data))